@@ -1,7 +1,13 @@
 # flake8: noqa
+from pypidb._compat import PY2
 from pypidb._db import Database
 from pypidb._version import __author__, __version__
 
 __name__ = "pypidb"
 
 __all__ = ["__name__", "__version__", "__author__", "Database"]
+
+if not PY2:
+    from pypidb._async import AsyncDatabase
+
+    __all__.append("AsyncDatabase")
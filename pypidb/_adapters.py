@@ -1,3 +1,6 @@
+import threading
+from contextlib import contextmanager
+
 import requests
 from logging_helper import setup_logging
 from requests.packages.urllib3.util.timeout import Timeout
@@ -301,3 +304,41 @@ class HTTPSAdapter(RedirectAdapter):
             logger.info("https blocked for {}".format(url))
             return super(HTTPSAdapter, self).get_redirect(url)
         return "https" + url[4:]
+
+
+class HostConcurrencyLimit(object):
+    """Bound the number of simultaneous requests sent to each host."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def _get_semaphore(self, host):
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = self._semaphores[host] = threading.BoundedSemaphore(
+                    self.limit
+                )
+            return semaphore
+
+    @contextmanager
+    def acquire(self, url):
+        semaphore = self._get_semaphore(urlsplit(url).netloc.lower())
+        with semaphore:
+            yield
+
+
+class HostLimitAdapter(requests.adapters.HTTPAdapter):
+    def __init__(self, *args, **kwargs):
+        host_limit = kwargs.pop("host_limit", None)
+        super(HostLimitAdapter, self).__init__(*args, **kwargs)
+        self._host_limit = host_limit
+
+    def send(self, request, *args, **kwargs):
+        if not self._host_limit:
+            return super(HostLimitAdapter, self).send(request, *args, **kwargs)
+
+        with self._host_limit.acquire(request.url):
+            return super(HostLimitAdapter, self).send(request, *args, **kwargs)
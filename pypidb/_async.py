@@ -0,0 +1,116 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from logging_helper import setup_logging
+
+from ._adapters import HostConcurrencyLimit
+from ._cache import get_file_cache_session
+from ._db import mappings
+from ._dns import install_dns_cache
+from ._similarity import normalize
+
+logger = setup_logging()
+
+# Python 3.5 and 3.6 only have get_event_loop
+_get_running_loop = getattr(asyncio, "get_running_loop", asyncio.get_event_loop)
+
+
+# Default workers per request allowed to each host; a lookup fetches
+# PyPI JSON and then pages of several other hosts
+_WORKERS_PER_HOST = 8
+
+
+class AsyncConverter(object):
+    """Awaitable front end to Converter.
+
+    Lookups already present in the mappings are answered on the event loop.
+    Others run the normal Converter resolution, with the same rules, cleaner
+    and similarity logic, on a pool of ``max_workers`` threads shared by
+    every lookup.  Each lookup in progress holds one thread, so at most
+    ``max_workers`` are resolved at once and further lookups wait for a
+    thread.  Requests are limited to ``per_host`` in flight for each host,
+    and ``max_workers`` defaults to eight times that.
+    """
+
+    def __init__(self, max_workers=None, per_host=4, **kwargs):
+        if max_workers is None:
+            max_workers = per_host * _WORKERS_PER_HOST
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.host_limit = HostConcurrencyLimit(per_host)
+        # Connections are pooled per host, which has at most per_host requests
+        if not kwargs.get("session"):
+            kwargs["session"] = get_file_cache_session(
+                "json", pool_maxsize=per_host, host_limit=self.host_limit
+            )
+            if not kwargs.get("web_session"):
+                kwargs["web_session"] = get_file_cache_session(
+                    "web", pool_maxsize=per_host, host_limit=self.host_limit
+                )
+        self._converter_kwargs = kwargs
+        self._local = threading.local()
+        self._converters = []
+
+    def _get_converter(self):
+        from ._pypi import Converter
+
+        converter = getattr(self._local, "converter", None)
+        if converter is None:
+            converter = self._local.converter = Converter(**self._converter_kwargs)
+            self._converters.append(converter)
+        return converter
+
+    def _get_vcs(self, name):
+        return self._get_converter().get_vcs(name)
+
+    async def get_vcs(self, name):
+        cached_result = mappings.get(normalize(name))
+        if cached_result:
+            if isinstance(cached_result, str):
+                return cached_result
+            raise cached_result
+
+        loop = _get_running_loop()
+        url = await loop.run_in_executor(self._executor, self._get_vcs, name)
+        return url
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        for converter in self._converters:
+            converter.close()
+
+
+class AsyncDatabase(object):
+    def __init__(self, dns_cache=None, **kwargs):
+        if dns_cache:
+            install_dns_cache(dns_cache)
+        self._converter = AsyncConverter(**kwargs)
+        self.projects = {}
+
+    async def find_project_scm_url(self, name):
+        normalized_name = normalize(name)
+        url = await self._converter.get_vcs(normalized_name)
+        self.projects[normalized_name] = url
+        return url
+
+    get_vcs = find_project_scm_url
+
+    async def _find(self, name):
+        try:
+            url = await self.find_project_scm_url(name)
+        except Exception as e:
+            logger.info("find_many {}: {!r}".format(name, e))
+            return name, e
+        return name, url
+
+    def find_many(self, names):
+        """Return awaitables in the order the lookups complete.
+
+        Each awaitable gives a tuple of the name and either the URL or the
+        exception raised while resolving it, as with Database.find_many.
+        """
+        return asyncio.as_completed([self._find(name) for name in set(names)])
+
+    def close(self):
+        self._converter.close()
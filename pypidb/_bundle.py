@@ -0,0 +1,331 @@
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import time
+
+import diskcache
+from logging_helper import setup_logging
+
+from pypidb._version import __version__
+
+from ._cache import (
+    CACHE_COMPRESSION,
+    CACHE_NAMESPACES,
+    _get_compressor,
+    cache_subdir,
+)
+from ._cache_backends import Compressor, SQLiteCache, _replace
+
+logger = setup_logging()
+
+BUNDLE_FORMAT = 1
+BUNDLE_NAMESPACES = CACHE_NAMESPACES + ("dns", "lookups")
+MANIFEST = "manifest.json"
+
+_SQLITE_HEADER = b"SQLite format 3\x00"
+_SKIPPED_SUFFIXES = (".lock", "-wal", "-shm", ".tmp")
+_DICTIONARY = "compression.dict"
+
+
+def _is_sqlite(filename):
+    with open(filename, "rb") as f:
+        return f.read(len(_SQLITE_HEADER)) == _SQLITE_HEADER
+
+
+def _iter_files(directory):
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.endswith(_SKIPPED_SUFFIXES):
+                continue
+            path = os.path.join(dirpath, filename)
+            yield path, os.path.relpath(path, directory)
+
+
+def _snapshot(filename, tmpdir):
+    """Copy a database which may be in use, with the sqlite backup api.
+
+    Without it, the database is dumped as SQL and loaded into the copy.
+    The copy uses a rollback journal rather than write-ahead logging, so
+    it can be read from a read-only directory.
+    """
+    target = os.path.join(tmpdir, "snapshot.sqlite")
+    source = sqlite3.connect(filename, timeout=30)
+    dest = sqlite3.connect(target)
+    try:
+        if hasattr(source, "backup"):
+            source.backup(dest)
+        else:  # Python < 3.7
+            source.execute("BEGIN")  # one snapshot of the database
+            dest.executescript("\n".join(source.iterdump()))
+            source.rollback()
+        dest.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dest.close()
+        source.close()
+    return target
+
+
+def export_bundle(filename, namespaces=None):
+    """Write the caches of `namespaces` to a gzip compressed tar bundle.
+
+    Returns the manifest, which records the number of files of each.
+    """
+    namespaces = namespaces or BUNDLE_NAMESPACES
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": __version__,
+        "created": int(time.time()),
+        "namespaces": {},
+    }
+    tmpdir = tempfile.mkdtemp()
+    try:
+        with tarfile.open(filename, "w:gz") as tar:
+            for namespace in namespaces:
+                directory = cache_subdir(namespace)
+                if not os.path.isdir(directory):
+                    continue
+                count = 0
+                for path, relpath in _iter_files(directory):
+                    if _is_sqlite(path):
+                        path = _snapshot(path, tmpdir)
+                    arcname = "/".join([namespace] + relpath.split(os.sep))
+                    tar.add(path, arcname=arcname)
+                    count += 1
+                manifest["namespaces"][namespace] = {"files": count}
+
+            data = json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8")
+            info = tarfile.TarInfo(MANIFEST)
+            info.size = len(data)
+            info.mtime = manifest["created"]
+            tar.addfile(info, io.BytesIO(data))
+    finally:
+        shutil.rmtree(tmpdir)
+    return manifest
+
+
+def publish_caches(directory, namespaces=None):
+    """Copy the response caches of `namespaces` to shared `directory`.
+
+    The result is laid out for $PYPIDB_SHARED_CACHE_DIR.  Each file is
+    replaced atomically, so readers may use `directory` meanwhile.
+    Returns the number of files copied for each namespace.
+    """
+    namespaces = namespaces or CACHE_NAMESPACES
+    copied = {}
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for namespace in namespaces:
+            source = cache_subdir(namespace)
+            if not os.path.isdir(source):
+                continue
+            count = 0
+            for path, relpath in _iter_files(source):
+                if _is_sqlite(path):
+                    path = _snapshot(path, tmpdir)
+                _copy_file(path, os.path.join(directory, namespace, relpath))
+                count += 1
+            copied[namespace] = count
+    finally:
+        shutil.rmtree(tmpdir)
+    return copied
+
+
+def _read_manifest(tar):
+    try:
+        manifest = json.loads(tar.extractfile(MANIFEST).read().decode("utf-8"))
+    except (KeyError, ValueError):
+        raise ValueError("Not a pypidb cache bundle")
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise ValueError(
+            "Unsupported cache bundle format {}".format(manifest.get("format"))
+        )
+    return manifest
+
+
+def _extract(tar, directory, namespaces):
+    members = []
+    for member in tar.getmembers():
+        parts = member.name.split("/")
+        if member.name.startswith("/") or ".." in parts:
+            raise ValueError("Unsafe path {} in cache bundle".format(member.name))
+        if member.isfile() and parts[0] in namespaces:
+            members.append(member)
+    tar.extractall(directory, members)
+
+
+def _get_transcoder(namespace, source, target):
+    """Return a function converting values of bundle `source` for `target`.
+
+    Values are compressed with the dictionary of the cache they were
+    written to, so they are decompressed with the dictionary of the bundle
+    and compressed again with the local one.  Returns None when values can
+    be copied unchanged.  The function returns None for unreadable values.
+    """
+    local = _get_compressor(namespace, target, CACHE_COMPRESSION)
+    bundled = Compressor(dictionary_filename=os.path.join(source, _DICTIONARY))
+    if local and local.dictionary_id == bundled.dictionary_id:
+        return None
+    if not local and not os.path.exists(os.path.join(source, _DICTIONARY)):
+        return None
+
+    def transcode(value):
+        value = bundled.decompress(value)
+        if value is None or not local:
+            return value
+        return local.compress(value)
+
+    return transcode
+
+
+def _merge_sqlite_cache(source, target, transcode=None):
+    """Add the entries of SQLiteCache database `source` missing from `target`."""
+    SQLiteCache(target).close()  # create the schema and triggers
+    conn = sqlite3.connect(target, timeout=30)
+    try:
+        conn.execute("PRAGMA recursive_triggers=ON")
+        conn.execute("ATTACH DATABASE ? AS bundle", (source,))
+        with conn:
+            if transcode:
+                added = _transcode_sqlite_cache(conn, transcode)
+            else:
+                conn.execute(
+                    "INSERT OR IGNORE INTO bodies (digest, value, size, refs) "
+                    "SELECT digest, value, size, 0 FROM bundle.bodies"
+                )
+                added = conn.execute(
+                    "INSERT OR IGNORE INTO cache "
+                    "(key, value, body, expires, size, accessed, hits) "
+                    "SELECT key, value, body, expires, size, accessed, 0 "
+                    "FROM bundle.cache"
+                ).rowcount
+            conn.execute("DELETE FROM bodies WHERE refs <= 0")
+        conn.execute("DETACH DATABASE bundle")
+    finally:
+        conn.close()
+    return added
+
+
+def _transcode_sqlite_cache(conn, transcode):
+    unreadable = set()
+    for digest, value in conn.execute(
+        "SELECT digest, value FROM bundle.bodies "
+        "WHERE digest NOT IN (SELECT digest FROM main.bodies)"
+    ).fetchall():
+        value = transcode(bytes(value))
+        if value is None:
+            unreadable.add(digest)
+            continue
+        conn.execute(
+            "INSERT INTO bodies (digest, value, size, refs) VALUES (?, ?, ?, 0)",
+            (digest, sqlite3.Binary(value), len(value)),
+        )
+
+    added = 0
+    for key, value, body, expires, accessed in conn.execute(
+        "SELECT key, value, body, expires, accessed FROM bundle.cache "
+        "WHERE key NOT IN (SELECT key FROM main.cache)"
+    ).fetchall():
+        value = transcode(bytes(value))
+        if value is None or body in unreadable:
+            continue
+        conn.execute(
+            "INSERT INTO cache (key, value, body, expires, size, accessed, hits) "
+            "VALUES (?, ?, ?, ?, ?, ?, 0)",
+            (key, sqlite3.Binary(value), body, expires, len(value), accessed),
+        )
+        added += 1
+    return added
+
+
+def _copy_file(path, target_path, transcode=None):
+    """Copy `path` to `target_path`, returning False for unreadable values."""
+    dirname = os.path.dirname(target_path)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    tmp_path = target_path + ".tmp"
+    if not transcode:
+        shutil.copy2(path, tmp_path)
+        _replace(tmp_path, target_path)
+        return True
+
+    with open(path, "rb") as f:
+        value = transcode(f.read())
+    if value is None:
+        return False
+    with open(tmp_path, "wb") as f:
+        f.write(value)
+    _replace(tmp_path, target_path)
+    return True
+
+
+def _merge_diskcache(source, target):
+    """Add the unexpired entries of diskcache `source` missing from `target`."""
+    added = 0
+    now = time.time()
+    with diskcache.Cache(source) as src, diskcache.Cache(target) as dest:
+        for key in src:
+            if key in dest:
+                continue
+            value, expire_time = src.get(key, expire_time=True)
+            if expire_time is None:
+                dest.set(key, value)
+            elif expire_time > now:
+                dest.set(key, value, expire=expire_time - now)
+            else:
+                continue
+            added += 1
+    return added
+
+
+def _merge_directory(namespace, source, target):
+    if os.path.exists(os.path.join(source, "cache.db")):
+        return _merge_diskcache(source, target)
+
+    transcode = _get_transcoder(namespace, source, target)
+    added = 0
+    for path, relpath in _iter_files(source):
+        target_path = os.path.join(target, relpath)
+        if relpath == _DICTIONARY:
+            # The local entries are compressed with the local dictionary
+            continue
+        if relpath == "cache.sqlite":
+            added += _merge_sqlite_cache(path, target_path, transcode)
+        elif os.sep in relpath:  # FileCache entries are nested
+            if not os.path.exists(target_path):
+                added += _copy_file(path, target_path, transcode)
+        elif not os.path.exists(target_path):
+            _copy_file(path, target_path)
+    return added
+
+
+def import_bundle(filename, namespaces=None):
+    """Merge a bundle written by export_bundle into the local caches.
+
+    Entries already cached locally are kept.  Compressed entries are
+    recompressed with the local dictionary, and those which can not be
+    decompressed are skipped.  Returns the number of entries added to
+    each namespace.
+    """
+    namespaces = namespaces or BUNDLE_NAMESPACES
+    tmpdir = tempfile.mkdtemp()
+    try:
+        with tarfile.open(filename, "r:*") as tar:
+            manifest = _read_manifest(tar)
+            namespaces = [ns for ns in namespaces if ns in manifest["namespaces"]]
+            _extract(tar, tmpdir, namespaces)
+
+        added = {}
+        for namespace in namespaces:
+            source = os.path.join(tmpdir, namespace)
+            if os.path.isdir(source):
+                added[namespace] = _merge_directory(
+                    namespace, source, cache_subdir(namespace)
+                )
+        return added
+    finally:
+        shutil.rmtree(tmpdir)
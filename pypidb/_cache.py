@@ -1,12 +1,19 @@
+import calendar
+import json
 import os
 import os.path
-import socket
+import threading
+import time
+import weakref
+from email.utils import parsedate_tz
+from functools import partial, wraps
 
+import diskcache
 import requests
 from appdirs import user_cache_dir
 from cachecontrol import CacheControlAdapter, CacheController
-from cachecontrol.caches.file_cache import FileCache
 from cachecontrol.heuristics import ExpiresAfter
+from cachecontrol.serialize import Serializer
 from logging_helper import setup_logging
 from requests.packages.urllib3.util.retry import Retry
 from requests.packages.urllib3.util.timeout import Timeout
@@ -16,12 +23,25 @@ from ._adapters import (
     CDNBlockAdapter,
     ContentTypeBlockAdapter,
     DomainListBlockAdapter,
+    HostLimitAdapter,
     HTTPSAdapter,
     IPBlockAdapter,
     LoginBlockAdapter,
     Status500Adapter,
 )
-from ._compat import urlsplit
+from ._cache_backends import (
+    AtomicFileCache,
+    BoundedFileCache,
+    CompressedCache,
+    Compressor,
+    LayeredCache,
+    MemoryCache,
+    SQLiteCache,
+)
+from ._compat import urljoin, urlsplit
+from ._dns import prefetch_hostnames, resolve_hostname
+from ._pypi_json import trim_package_json_body
+from ._version import __version__
 
 try:
     from future.standard_library import install_aliases
@@ -34,6 +54,16 @@ _block_request_adapter = Status500Adapter()
 logger = setup_logging()
 _CI = os.getenv("CI", "")
 
+CACHE_BACKEND = os.getenv("PYPIDB_CACHE_BACKEND", "file")
+CACHE_NAMESPACES = ("json", "web", "gh", "rtd", "launchpad")
+CACHE_COMPRESSION = os.getenv("PYPIDB_CACHE_COMPRESSION")
+COMPRESSED_NAMESPACES = ("json", "web")
+CACHE_EVICTION = os.getenv("PYPIDB_CACHE_EVICTION", "lru")
+# Seconds a stale PyPI JSON response may be used while it is refreshed
+JSON_MAX_STALE = int(os.getenv("PYPIDB_JSON_MAX_STALE", 2 * 24 * 60 * 60))
+STORAGE_MODES = ("full", "trimmed")
+JSON_STORAGE = os.getenv("PYPIDB_JSON_STORAGE", "full")
+
 MAX_REDIRECTS = 10
 retries = 3
 backoff_factor = 0.3
@@ -53,6 +83,132 @@ def cache_subdir(name):
     return dirpath
 
 
+def parse_size(value):
+    """Convert a size such as 500M to bytes."""
+    if not value:
+        return None
+    value = str(value).strip().upper().rstrip("B")
+    multiplier = 1
+    for suffix, suffix_multiplier in (("K", 1024), ("M", 1024 ** 2), ("G", 1024 ** 3)):
+        if value.endswith(suffix):
+            value = value[:-1]
+            multiplier = suffix_multiplier
+            break
+    return int(float(value) * multiplier)
+
+
+CACHE_MAX_SIZE = parse_size(os.getenv("PYPIDB_CACHE_MAX_SIZE"))
+CACHE_SHARED_DIR = os.getenv("PYPIDB_SHARED_CACHE_DIR")
+
+
+def _get_compressor(cache_name, cache_path, compression):
+    if cache_name in COMPRESSED_NAMESPACES and compression != "none":
+        return Compressor(compression, os.path.join(cache_path, "compression.dict"))
+
+
+def _get_shared_cache(cache_name, shared_dir, compression):
+    """Return the read-only cache of `cache_name` under `shared_dir`, if any."""
+    cache_path = os.path.join(shared_dir, cache_name)
+    if not os.path.isdir(cache_path):
+        return None
+    compressor = _get_compressor(cache_name, cache_path, compression)
+    filename = os.path.join(cache_path, "cache.sqlite")
+    if os.path.exists(filename):
+        return SQLiteCache(filename, compressor=compressor, read_only=True)
+    cache = AtomicFileCache(cache_path)
+    if compressor:
+        cache = CompressedCache(cache, compressor)
+    return cache
+
+
+def get_cache(
+    cache_name, backend=None, compression=None, max_size=None, shared_dir=None
+):
+    """Return the response cache of namespace `cache_name`.
+
+    `backend` is "file" for one file per response, or "sqlite" for a single
+    database file per namespace.  It defaults to $PYPIDB_CACHE_BACKEND.
+
+    Values in the `json` and `web` namespaces are compressed with
+    `compression`, "zstd" or "zlib", defaulting to $PYPIDB_CACHE_COMPRESSION
+    or the best available.  "none" disables compression.
+
+    Entries are evicted when the namespace exceeds `max_size` bytes,
+    defaulting to $PYPIDB_CACHE_MAX_SIZE, using $PYPIDB_CACHE_EVICTION.
+
+    `shared_dir`, defaulting to $PYPIDB_SHARED_CACHE_DIR, is a directory of
+    caches of either backend, such as an imported bundle, which is read
+    after the local cache and never written.
+    """
+    backend = backend or CACHE_BACKEND
+    compression = compression or CACHE_COMPRESSION
+    max_size = max_size or CACHE_MAX_SIZE
+    shared_dir = shared_dir or CACHE_SHARED_DIR
+    cache_path = cache_subdir(cache_name)
+    compressor = _get_compressor(cache_name, cache_path, compression)
+
+    if backend == "file":
+        cache = BoundedFileCache(cache_path, max_size=max_size)
+        if compressor:
+            cache = CompressedCache(cache, compressor)
+    elif backend == "sqlite":
+        # Compresses responses and their deduplicated bodies separately
+        cache = SQLiteCache(
+            os.path.join(cache_path, "cache.sqlite"),
+            max_size=max_size,
+            policy=CACHE_EVICTION,
+            compressor=compressor,
+        )
+    else:
+        raise ValueError("Unknown cache backend {}".format(backend))
+
+    if shared_dir:
+        shared = _get_shared_cache(cache_name, shared_dir, compression)
+        if shared:
+            cache = LayeredCache(cache, shared)
+    return cache
+
+
+_memory_caches = {}
+_memory_caches_lock = threading.Lock()
+
+
+def _get_memory_cache(cache_name, backend, policy):
+    """Return the MemoryCache of the namespace, shared by its sessions.
+
+    The disk cache behind it is only created by the first session with
+    the same backend, directories, eviction and storage.
+    """
+    backend = backend or CACHE_BACKEND
+    key = (
+        cache_name,
+        cache_subdir(cache_name),
+        backend,
+        CACHE_SHARED_DIR,
+        policy.max_size,
+        policy.storage,
+    )
+    with _memory_caches_lock:
+        memory_cache = _memory_caches.get(key)
+        if memory_cache is None or memory_cache.max_size != policy.memory_size:
+            cache = get_cache(cache_name, backend, max_size=policy.max_size)
+            memory_cache = MemoryCache(cache, policy.memory_size)
+            _memory_caches[key] = memory_cache
+    return memory_cache
+
+
+def memory_cache_stats():
+    """Return the in-memory hits, misses, entries and size of each namespace."""
+    with _memory_caches_lock:
+        items = list(_memory_caches.items())
+    stats = {}
+    for key, cache in items:
+        totals = stats.setdefault(key[0], {})
+        for name, value in cache.memory_stats().items():
+            totals[name] = totals.get(name, 0) + value
+    return stats
+
+
 def get_timeout(url):
     if "wiki.ros.org" in url or "abyz.me.uk" in url:
         return Timeout(connect=15, read=20, total=45)
@@ -80,12 +236,18 @@ def _check_url_domain(url):
         return False
     if not p.netloc:
         return False
-    try:
-        socket.gethostbyname(p.netloc)
-    except Exception as e:
-        logger.info("domain {} lookup error: {}".format(url, e))
-        return False
-    return True
+    return resolve_hostname(p.netloc)
+
+
+def prefetch_url_domains(urls):
+    """Resolve the domains of `urls` concurrently for _check_url_domain."""
+    netlocs = set()
+    for url in urls:
+        try:
+            netlocs.add(urlsplit(url).netloc)
+        except Exception:
+            continue
+    prefetch_hostnames(netlocs)
 
 
 class IgnoreVaryExpiresAfter(ExpiresAfter):
@@ -96,14 +258,348 @@ class IgnoreVaryExpiresAfter(ExpiresAfter):
         return headers
 
 
+TRACKING_PARAMETER_PREFIXES = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid", "_ga")
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+def canonical_cache_url(url):
+    """Return the cache key of `url`, folding variants of the same page.
+
+    http and https, a www. prefix, a trailing slash and tracking query
+    parameters do not change the key.
+    """
+    url = CacheController._urlnorm(url)
+    p = urlsplit(url)
+    if p.scheme not in ("http", "https"):
+        return url
+
+    netloc = p.netloc
+    if netloc.startswith("www."):
+        netloc = netloc[4:]
+    if netloc.endswith(":80") or netloc.endswith(":443"):
+        netloc = netloc.rsplit(":", 1)[0]
+    path = p.path.rstrip("/") or "/"
+    query = "&".join(
+        part
+        for part in p.query.split("&")
+        if part and not part.lower().startswith(TRACKING_PARAMETER_PREFIXES)
+    )
+    return p._replace(scheme="https", netloc=netloc, path=path, query=query).geturl()
+
+
+DAY = 24 * 60 * 60
+DEFAULT_TTL = 5 * DAY
+DEFAULT_STATUS_CODES = (200, 203, 300, 301, 302, 401, 404)
+DEFAULT_MEMORY_SIZE = 16 * 1024 * 1024
+
+
+class CachePolicy(object):
+    """How responses of one cache namespace are cached.
+
+    `ttl` is the seconds a response is used before it is refetched,
+    `status_codes` are the cacheable response status codes, `max_stale`
+    is described in MoreCodesCacheController and `max_size` is the eviction
+    budget in bytes.  `memory_size` bytes of responses are also held in
+    memory, shared by sessions of the namespace.  `heuristic` replaces the
+    `ttl` heuristic.
+    `canonical_keys` stores variants of a url under one key, see
+    canonical_cache_url.
+    `storage` "trimmed" stores PyPI JSON responses reduced to the fields
+    used, see TrimmedJsonSerializer.
+    """
+
+    fields = (
+        "ttl",
+        "status_codes",
+        "max_stale",
+        "max_size",
+        "memory_size",
+        "canonical_keys",
+        "heuristic",
+        "storage",
+    )
+
+    def __init__(
+        self,
+        ttl=DEFAULT_TTL,
+        status_codes=DEFAULT_STATUS_CODES,
+        max_stale=None,
+        max_size=None,
+        memory_size=DEFAULT_MEMORY_SIZE,
+        canonical_keys=False,
+        heuristic=None,
+        storage="full",
+    ):
+        if storage not in STORAGE_MODES:
+            raise ValueError("Unknown cache storage mode {}".format(storage))
+        self.ttl = ttl
+        self.status_codes = tuple(status_codes)
+        self.max_stale = max_stale
+        self.max_size = max_size
+        self.memory_size = memory_size
+        self.canonical_keys = canonical_keys
+        self.heuristic = heuristic
+        self.storage = storage
+
+    def __repr__(self):
+        values = ["{}={!r}".format(name, getattr(self, name)) for name in self.fields]
+        return "CachePolicy({})".format(", ".join(values))
+
+    def replace(self, **changes):
+        kwargs = dict((name, getattr(self, name)) for name in self.fields)
+        kwargs.update(changes)
+        return CachePolicy(**kwargs)
+
+    def get_heuristic(self):
+        return self.heuristic or IgnoreVaryExpiresAfter(seconds=self.ttl)
+
+    def get_serializer(self):
+        if self.storage == "trimmed":
+            return TrimmedJsonSerializer()
+
+    def get_controller_class(self):
+        return partial(
+            MoreCodesCacheController,
+            status_codes=self.status_codes,
+            canonical_keys=self.canonical_keys,
+        )
+
+
+cache_policies = {
+    "json": CachePolicy(max_stale=JSON_MAX_STALE, storage=JSON_STORAGE),
+    "web": CachePolicy(canonical_keys=True),
+    "gh": CachePolicy(),
+    "rtd": CachePolicy(),
+    "launchpad": CachePolicy(),
+}
+
+
+def get_cache_policy(cache_name):
+    return cache_policies.get(cache_name) or CachePolicy()
+
+
+def set_cache_policy(cache_name, **changes):
+    """Change the policy of namespace `cache_name` for sessions created later."""
+    cache_policies[cache_name] = get_cache_policy(cache_name).replace(**changes)
+    return cache_policies[cache_name]
+
+
+def load_cache_policies(filename):
+    """Load policy changes from a JSON object keyed by namespace.
+
+    For example {"gh": {"ttl": 2592000}, "json": {"status_codes": [200, 404]}}
+    """
+    with open(filename) as f:
+        config = json.load(f)
+    for cache_name, changes in config.items():
+        unknown = set(changes) - set(CachePolicy.fields) - set(["heuristic"])
+        if unknown:
+            raise ValueError(
+                "Unknown cache policy settings for {}: {}".format(
+                    cache_name, ", ".join(sorted(unknown))
+                )
+            )
+        for name in ("max_size", "memory_size"):
+            if name in changes:
+                changes[name] = parse_size(changes[name])
+        set_cache_policy(cache_name, **changes)
+
+
+# Seconds the results of network lookups of urls are kept, 0 disabling
+LOOKUP_TTL = int(os.getenv("PYPIDB_LOOKUP_TTL", 30 * DAY))
+LOOKUP_NEGATIVE_TTL = int(os.getenv("PYPIDB_LOOKUP_NEGATIVE_TTL", DAY))
+_lookup_cache = None
+_lookup_cache_lock = threading.Lock()
+
+
+def get_lookup_cache():
+    """Return the diskcache of the lookups namespace."""
+    global _lookup_cache
+    with _lookup_cache_lock:
+        directory = cache_subdir("lookups")
+        if _lookup_cache is None or _lookup_cache.directory != directory:
+            _lookup_cache = diskcache.Cache(directory)
+        return _lookup_cache
+
+
+class LookupFailure(Exception):
+    """A failure of a cached_lookup function which may not recur."""
+
+
+# Raised by lookups on network failures and unexpected responses
+_LOOKUP_ERRORS = (requests.RequestException, ValueError)
+_lookup_state = threading.local()
+
+
+def cached_lookup(func):
+    """Remember the results of `func` on disk, keyed by its arguments.
+
+    Results are kept for LOOKUP_TTL seconds, and None for
+    LOOKUP_NEGATIVE_TTL seconds.  Results of another pypidb version are
+    not used.
+
+    Network errors and invalid responses raised by `func` are raised as
+    LookupFailure.  They are not cached, and neither are the results of
+    lookups which called a failed lookup, even if they caught the error.
+    """
+    name = "{}.{}".format(func.__module__, func.__name__)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        cache = get_lookup_cache() if LOOKUP_TTL else None
+        key = (name, __version__) + args + tuple(sorted(kwargs.items()))
+        if cache is not None:
+            result = cache.get(key, default=diskcache.ENOVAL)
+            if result is not diskcache.ENOVAL:
+                return result
+
+        caller_failed = getattr(_lookup_state, "failed", False)
+        _lookup_state.failed = failed = False
+        try:
+            result = func(*args, **kwargs)
+        except _LOOKUP_ERRORS as e:
+            failed = True
+            raise LookupFailure("{}{!r}: {!r}".format(name, args, e))
+        except LookupFailure:
+            failed = True
+            raise
+        finally:
+            failed = failed or _lookup_state.failed
+            _lookup_state.failed = caller_failed or failed
+
+        if cache is not None and not failed:
+            ttl = LOOKUP_TTL if result is not None else LOOKUP_NEGATIVE_TTL
+            cache.set(key, result, expire=ttl)
+        return result
+
+    return wrapper
+
+
+class _TrimmedResponse(object):
+    """The parts of a response stored by Serializer, with a new body."""
+
+    def __init__(self, response, body):
+        self.headers = dict(
+            (name, value)
+            for name, value in response.headers.items()
+            if name.lower() not in ("content-encoding", "content-length")
+        )
+        self.headers["Content-Length"] = str(len(body))
+        self.status = response.status
+        self.version = response.version
+        self.reason = response.reason
+        # read by CacheControl 0.12, removed from urllib3 2
+        self.strict = getattr(response, "strict", 0)
+        self.decode_content = response.decode_content
+
+
+class TrimmedJsonSerializer(Serializer):
+    """Serializer storing PyPI JSON bodies reduced by trim_package_json.
+
+    Other bodies, and those which can not be decoded, are stored unchanged.
+    """
+
+    def dumps(self, request, response, body=None):
+        if body and response.status == 200:
+            trimmed = trim_package_json_body(
+                body, response.headers.get("content-encoding")
+            )
+            if trimmed is not None:
+                response, body = _TrimmedResponse(response, trimmed), trimmed
+        return super(TrimmedJsonSerializer, self).dumps(request, response, body)
+
+
 class MoreCodesCacheController(CacheController):
+    """Controller caching more status codes, with stale-while-revalidate.
+
+    When `max_stale` seconds is set, a response which has been stale for
+    less than that is returned and `revalidate(request)` is called to
+    refresh it.
+
+    With `canonical_keys`, responses are stored by canonical_cache_url,
+    except redirects between variants of the same url.
+    """
+
     def __init__(
-        self, cache=None, cache_etags=True, serializer=None, status_codes=None
+        self,
+        cache=None,
+        cache_etags=True,
+        serializer=None,
+        status_codes=None,
+        canonical_keys=False,
     ):
-        status_codes = status_codes or (200, 203, 300, 301, 302, 401, 404)
+        status_codes = status_codes or DEFAULT_STATUS_CODES
         super(MoreCodesCacheController, self).__init__(
             cache, cache_etags, serializer, status_codes
         )
+        self.canonical_keys = canonical_keys
+        self.max_stale = None
+        self.revalidate = None
+
+    def cache_url(self, uri):
+        if self.canonical_keys:
+            return canonical_cache_url(uri)
+        return self._urlnorm(uri)
+
+    def _is_variant_redirect(self, url, response):
+        if not self.canonical_keys or int(response.status) not in REDIRECT_STATUSES:
+            return False
+        location = response.headers.get("location")
+        if not location:
+            return False
+        return self.cache_url(urljoin(url, location)) == self.cache_url(url)
+
+    def cache_response(self, request, response, body=None, status_codes=None):
+        target = response
+        if isinstance(response, weakref.ReferenceType):
+            target = response()
+        if target is not None and self._is_variant_redirect(request.url, target):
+            return
+        super(MoreCodesCacheController, self).cache_response(
+            request, response, body, status_codes
+        )
+
+    def _load_from_cache(self, request):
+        # CacheController._load_from_cache looks up request.url, not cache_url
+        if "Range" in request.headers:
+            return None
+        cache_data = self.cache.get(self.cache_url(request.url))
+        if cache_data is None:
+            return None
+        response = self.serializer.loads(request, cache_data)
+        if response and self._is_variant_redirect(request.url, response):
+            return None
+        return response
+
+    def _staleness(self, response):
+        headers = self.parse_cache_control(response.headers)
+        date = parsedate_tz(response.headers.get("date", ""))
+        if not date:
+            return None
+        date = calendar.timegm(date[:6])
+        if "max-age" in headers:
+            lifetime = headers["max-age"]
+        else:
+            expires = parsedate_tz(response.headers.get("expires", ""))
+            if not expires:
+                return None
+            lifetime = calendar.timegm(expires[:6]) - date
+        return time.time() - date - lifetime
+
+    def cached_request(self, request):
+        if self.max_stale and self.revalidate:
+            cc = self.parse_cache_control(request.headers)
+            if "no-cache" not in cc and "max-age" not in cc:
+                response = self._load_from_cache(request)
+                if not response:
+                    return False
+                staleness = self._staleness(response)
+                if staleness is not None and staleness <= self.max_stale:
+                    if staleness > 0:
+                        logger.debug("Revalidating stale {}".format(request.url))
+                        self.revalidate(request)
+                    return response
+        return super(MoreCodesCacheController, self).cached_request(request)
 
 
 class ForceTimeoutHTTPAdapter(
@@ -114,11 +610,41 @@ class ForceTimeoutHTTPAdapter(
     ContentTypeBlockAdapter,
     HTTPSAdapter,
     CacheControlAdapter,
+    HostLimitAdapter,  # after the cache, so only network requests are limited
 ):
     def __init__(self, *args, **kw):
         timeout = kw.pop("timeout", None)
+        max_stale = kw.pop("max_stale", None)
         super(ForceTimeoutHTTPAdapter, self).__init__(*args, **kw)
         self.timeout = timeout
+        self._revalidations = {}
+        self._revalidations_lock = threading.Lock()
+        if max_stale:
+            self.controller.max_stale = max_stale
+            self.controller.revalidate = self._revalidate
+
+    def _revalidate(self, request):
+        """Refresh the cached response of `request` in a background thread."""
+        url = request.url
+        with self._revalidations_lock:
+            if url in self._revalidations:
+                return
+            request = request.copy()
+            request.headers["Cache-Control"] = "no-cache"
+            thread = threading.Thread(target=self._send_revalidation, args=(request,))
+            thread.daemon = True
+            self._revalidations[url] = thread
+        thread.start()
+
+    def _send_revalidation(self, request):
+        try:
+            response = self.send(request, timeout=get_timeout(request.url))
+            response.content  # reading the body stores it in the cache
+        except Exception as e:
+            logger.info("revalidation of {} failed: {!r}".format(request.url, e))
+        finally:
+            with self._revalidations_lock:
+                self._revalidations.pop(request.url, None)
 
     def send(self, request, cacheable_methods=None, timeout=None, **kw):
         if self.timeout and not timeout:  # pragma: no cover
@@ -322,8 +848,20 @@ def CacheControl(
     return sess
 
 
-def get_file_cache_session(cache_name):
-    cache_path = cache_subdir(cache_name)
+def get_file_cache_session(
+    cache_name,
+    pool_maxsize=None,
+    host_limit=None,
+    backend=None,
+    max_stale=None,
+    policy=None,
+):
+    """Return a caching session for namespace `cache_name`.
+
+    `policy` defaults to the CachePolicy of the namespace, see
+    set_cache_policy, and `max_stale` overrides its max_stale.
+    """
+    policy = policy or get_cache_policy(cache_name)
 
     https_exceptions = {
         "code.welldev.org",  # pypi oauth_provider; nothing on https; http is parked
@@ -462,16 +1000,34 @@ def get_file_cache_session(cache_name):
 
     base = os.path.dirname(__file__)
 
+    adapter_kw = {}
+    if pool_maxsize:
+        # Allow one connection per worker to each host, see Database.find_many
+        adapter_kw["pool_maxsize"] = pool_maxsize
+    if host_limit:
+        adapter_kw["host_limit"] = host_limit
+    if max_stale is None:
+        max_stale = policy.max_stale
+    if max_stale:
+        adapter_kw["max_stale"] = max_stale
+
+    if policy.memory_size:
+        cache = _get_memory_cache(cache_name, backend, policy)
+    else:
+        cache = get_cache(cache_name, backend, max_size=policy.max_size)
+
     session = requests.Session()
     session = CacheControl(
         session,
-        cache=FileCache(cache_path),
-        controller_class=MoreCodesCacheController,
+        cache=cache,
+        serializer=policy.get_serializer(),
+        controller_class=policy.get_controller_class(),
         adapter_class=ForceTimeoutHTTPAdapter,
         cacheable_methods=("GET"),  # https://github.com/ionrock/cachecontrol/issues/216
-        heuristic=IgnoreVaryExpiresAfter(days=5),
+        heuristic=policy.get_heuristic(),
         blocklist=os.path.join(base, "park_providers.txt"),
         https_exceptions=https_exceptions,
+        **adapter_kw
     )
     session.max_redirects = MAX_REDIRECTS
 
@@ -489,3 +1045,6 @@ def get_file_cache_session(cache_name):
 
 
 get_file_cache = get_file_cache_session
+
+if os.getenv("PYPIDB_CACHE_CONFIG"):
+    load_cache_policies(os.getenv("PYPIDB_CACHE_CONFIG"))
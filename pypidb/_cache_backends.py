@@ -0,0 +1,945 @@
+import calendar
+import hashlib
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+import msgpack
+from cachecontrol.cache import BaseCache
+from cachecontrol.caches.file_cache import FileCache
+from cachetools import LRUCache
+
+from ._compat import PY2, pathname2url
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+_COMPRESSED_MAGIC = b"pz"
+_CODECS = {"zlib": b"z", "zstd": b"s"}
+DICTIONARY_SIZE = 32 * 1024
+
+EVICTION_POLICIES = ("lru", "lfu")
+_EVICTION_INTERVAL = 100  # sets between size checks
+_EVICTION_TARGET = 0.9  # fraction of max_size remaining after eviction
+_COUNTER_FLUSH = 100
+_READ_ONLY_MMAP_SIZE = 1024 ** 3
+_TEMPORARY_SUFFIX = ".tmp"
+_STALE_TEMPORARY_AGE = 3600  # seconds before an unrenamed write is abandoned
+
+_replace = getattr(os, "replace", os.rename)
+_WAL_VERSION = 2  # file format version bytes of write-ahead logging databases
+_ENTRY_PREFIX = b"cc=4,"
+
+
+_BODY_KEY = msgpack.dumps(u"body")
+_EMPTY_BODY = _BODY_KEY + msgpack.dumps(b"", use_bin_type=True)
+
+
+def _bin_header(size):
+    if size < 0x100:
+        return struct.pack(">BB", 0xC4, size)
+    if size < 0x10000:
+        return struct.pack(">BH", 0xC5, size)
+    return struct.pack(">BI", 0xC6, size)
+
+
+def _split_body(value):
+    """Split a serialized response into the response without body, and body.
+
+    Values which are not serialized responses with a body are not split.
+    The body is cut out of the serialized bytes rather than serializing
+    the response again, so they can be joined in the same way.
+    """
+    if not value.startswith(_ENTRY_PREFIX) or _BODY_KEY not in value:
+        return value, None
+    try:
+        data = msgpack.loads(value[len(_ENTRY_PREFIX) :], raw=False)
+        body = data["response"]["body"]
+    except Exception:
+        return value, None
+    if not body or not isinstance(body, bytes):
+        return value, None
+    encoded = _BODY_KEY + _bin_header(len(body)) + body
+    start = value.find(encoded)
+    if start != -1 and value.find(encoded, start + 1) == -1:
+        value = value[:start] + _EMPTY_BODY + value[start + len(encoded) :]
+        if value.count(_EMPTY_BODY) == 1:
+            return value, body
+    data["response"]["body"] = b""
+    return _ENTRY_PREFIX + msgpack.dumps(data, use_bin_type=True), body
+
+
+def _join_body(value, body):
+    start = value.find(_EMPTY_BODY)
+    if start != -1 and value.find(_EMPTY_BODY, start + 1) == -1:
+        return b"".join(
+            [
+                value[:start],
+                _BODY_KEY,
+                _bin_header(len(body)),
+                body,
+                value[start + len(_EMPTY_BODY) :],
+            ]
+        )
+    data = msgpack.loads(value[len(_ENTRY_PREFIX) :], raw=False)
+    data["response"]["body"] = body
+    return _ENTRY_PREFIX + msgpack.dumps(data, use_bin_type=True)
+
+
+class Compressor(object):
+    """Compress values with zstd, or zlib without it.
+
+    A dictionary trained from the cached values of the namespace may be
+    stored in `dictionary_filename`.  Values compressed with a different
+    dictionary can not be decompressed, and values written without
+    compression are returned unchanged.
+    """
+
+    def __init__(self, codec=None, dictionary_filename=None, level=6):
+        if not codec:
+            codec = "zstd" if zstandard else "zlib"
+        if codec not in _CODECS or (codec == "zstd" and not zstandard):
+            raise ValueError("Unsupported compression {}".format(codec))
+        self.codec = codec
+        self.level = level
+        self.dictionary_filename = dictionary_filename
+        self._load_dictionary()
+
+    @property
+    def dictionary_id(self):
+        """The crc32 of the dictionary, or 0 without one."""
+        return self._dictionary_id
+
+    def _load_dictionary(self):
+        self.dictionary = None
+        self._dictionary_id = 0
+        self._zstd_dictionary = None
+        if not self.dictionary_filename:
+            return
+        try:
+            with open(self.dictionary_filename, "rb") as f:
+                self.dictionary = f.read()
+        except (IOError, OSError):
+            return
+        self._dictionary_id = zlib.crc32(self.dictionary) & 0xFFFFFFFF
+        if zstandard:
+            self._zstd_dictionary = zstandard.ZstdCompressionDict(self.dictionary)
+
+    def compress(self, value):
+        if self.codec == "zstd":
+            compressor = zstandard.ZstdCompressor(
+                level=self.level, dict_data=self._zstd_dictionary
+            )
+            payload = compressor.compress(value)
+        elif self.dictionary:
+            compressor = zlib.compressobj(
+                self.level,
+                zlib.DEFLATED,
+                zlib.MAX_WBITS,
+                zlib.DEF_MEM_LEVEL,
+                zlib.Z_DEFAULT_STRATEGY,
+                self.dictionary,
+            )
+            payload = compressor.compress(value) + compressor.flush()
+        else:
+            payload = zlib.compress(value, self.level)
+        header = _COMPRESSED_MAGIC + _CODECS[self.codec]
+        return header + struct.pack(">I", self._dictionary_id) + payload
+
+    def decompress(self, value):
+        """Return the original value, or None if it can not be decompressed."""
+        if not value or not value.startswith(_COMPRESSED_MAGIC):
+            return value
+        codec = value[2:3]
+        (dictionary_id,) = struct.unpack(">I", value[3:7])
+        payload = value[7:]
+        if dictionary_id != self._dictionary_id:
+            return None
+        try:
+            if codec == _CODECS["zstd"]:
+                if not zstandard:  # pragma: no cover
+                    return None
+                decompressor = zstandard.ZstdDecompressor(
+                    dict_data=self._zstd_dictionary
+                )
+                return decompressor.decompress(payload)
+            if dictionary_id:
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS, self.dictionary)
+                return decompressor.decompress(payload) + decompressor.flush()
+            return zlib.decompress(payload)
+        except Exception:
+            return None
+
+    def train(self, samples, size=DICTIONARY_SIZE):
+        """Build and save a dictionary from `samples`.
+
+        Values compressed with the previous dictionary become unreadable.
+        """
+        samples = [sample for sample in samples if sample]
+        if not samples:
+            raise ValueError("No samples to train a dictionary")
+
+        if self.codec == "zstd":
+            dictionary = zstandard.train_dictionary(size, samples).as_bytes()
+        else:
+            # zlib prefers matches near the end of the dictionary, so
+            # the start of each sample, where headers are, is used.
+            per_sample = max(size // len(samples), 256)
+            dictionary = b"".join(sample[:per_sample] for sample in samples)[-size:]
+
+        tmp_filename = self.dictionary_filename + ".tmp"
+        with open(tmp_filename, "wb") as f:
+            f.write(dictionary)
+        os.rename(tmp_filename, self.dictionary_filename)
+        self._load_dictionary()
+        return len(dictionary)
+
+
+def _uses_wal(filename):
+    with open(filename, "rb") as f:
+        header = f.read(20)
+    return len(header) == 20 and _WAL_VERSION in bytearray(header[18:20])
+
+
+class SQLiteCache(BaseCache):
+    """Cache storing all entries of a namespace in one SQLite database.
+
+    Each thread, and each process after a fork, uses its own connection.
+    Write-ahead logging lets readers proceed while another process writes.
+
+    When `max_size` bytes is exceeded, entries are evicted by `policy`,
+    "lru" for least recently used or "lfu" for least frequently used.
+
+    Response bodies are stored once per sha256 digest, and reference
+    counted, so urls returning identical bodies share the storage.
+    Responses and bodies are compressed separately by `compressor`.
+
+    Hit counts, and access times when `max_size` is set, are batched in
+    memory with the other counters rather than written on every get.
+
+    A `read_only` database is opened read-only and memory mapped, and
+    access times and counters are not recorded.  It may still be changed
+    by its writer.  It must not use write-ahead logging, which needs a
+    writable directory; see publish_caches.
+    """
+
+    def __init__(
+        self,
+        filename,
+        timeout=30,
+        max_size=None,
+        policy="lru",
+        compressor=None,
+        read_only=False,
+    ):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError("Unknown eviction policy {}".format(policy))
+        self.filename = filename
+        self.timeout = timeout
+        self.max_size = max_size
+        self.policy = policy
+        self.compressor = compressor
+        self.read_only = read_only
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0}
+        self._accesses = {}
+        self._sets = 0
+        if read_only:
+            if _uses_wal(filename):
+                raise ValueError(
+                    "{} uses write-ahead logging, so can not be shared read-only; "
+                    "copy it with pypidb cache publish".format(filename)
+                )
+            return
+
+        dirname = os.path.dirname(filename)
+        if dirname and not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:  # pragma: no cover
+                if not os.path.isdir(dirname):
+                    raise
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, body TEXT, "
+                "expires INTEGER, size INTEGER NOT NULL, accessed REAL NOT NULL, "
+                "hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_body ON cache (body)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS bodies ("
+                "digest TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                "size INTEGER NOT NULL, refs INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS bodies_refs ON bodies (refs)")
+            # Unreferenced bodies are removed by _collect_bodies
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS cache_body_ref "
+                "AFTER INSERT ON cache WHEN NEW.body IS NOT NULL BEGIN "
+                "UPDATE bodies SET refs = refs + 1 WHERE digest = NEW.body; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS cache_body_unref "
+                "AFTER DELETE ON cache WHEN OLD.body IS NOT NULL BEGIN "
+                "UPDATE bodies SET refs = refs - 1 WHERE digest = OLD.body; END"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                "name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+
+    def _connect(self):
+        if self.read_only:
+            # Not immutable, as the database may be updated by another host
+            if PY2:
+                # Without uri support; sqlite falls back to opening the file
+                # read-only when it is not writable
+                conn = sqlite3.connect(self.filename, timeout=self.timeout)
+                conn.execute("PRAGMA query_only=ON")
+            else:
+                uri = "file:{}?mode=ro".format(pathname2url(self.filename))
+                conn = sqlite3.connect(uri, timeout=self.timeout, uri=True)
+            conn.execute("PRAGMA mmap_size={}".format(_READ_ONLY_MMAP_SIZE))
+            return conn
+        conn = sqlite3.connect(self.filename, timeout=self.timeout)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # INSERT OR REPLACE then fires the delete trigger
+        conn.execute("PRAGMA recursive_triggers=ON")
+        return conn
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name, key=None):
+        if self.read_only:
+            return
+        with self._lock:
+            if name:
+                self._counters[name] += 1
+            if key is not None:
+                hits, accessed = self._accesses.get(key, (0, None))
+                self._accesses[key] = hits + 1, time.time()
+            if sum(self._counters.values()) + len(self._accesses) < _COUNTER_FLUSH:
+                return
+        self._flush_counters()
+
+    def _flush_counters(self):
+        if self.read_only:
+            return
+        with self._lock:
+            counters = self._counters
+            accesses = self._accesses
+            self._counters = {"hits": 0, "misses": 0}
+            self._accesses = {}
+        with self._connection() as conn:
+            # access times are only read when evicting
+            if not self.max_size:
+                accesses = dict((key, (hits, 0)) for key, (hits, _) in accesses.items())
+            conn.executemany(
+                "UPDATE cache SET hits = hits + ?, "
+                "accessed = MAX(accessed, ?) WHERE key = ?",
+                [(hits, accessed, key) for key, (hits, accessed) in accesses.items()],
+            )
+            for name, value in counters.items():
+                conn.execute(
+                    "INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)",
+                    (name,),
+                )
+                conn.execute(
+                    "UPDATE counters SET value = value + ? WHERE name = ?",
+                    (value, name),
+                )
+
+    def _encode(self, value):
+        if self.compressor:
+            value = self.compressor.compress(value)
+        return sqlite3.Binary(value)
+
+    def _decode(self, value, body=None):
+        value = bytes(value)
+        if self.compressor:
+            value = self.compressor.decompress(value)
+        if body is not None and value is not None:
+            body = bytes(body)
+            if self.compressor:
+                body = self.compressor.decompress(body)
+            if body is None:
+                return None
+            value = _join_body(value, body)
+        return value
+
+    def _collect_bodies(self, conn):
+        conn.execute("DELETE FROM bodies WHERE refs <= 0")
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT cache.value, bodies.value FROM cache "
+            "LEFT JOIN bodies ON bodies.digest = cache.body WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if not row:
+            self._count("misses")
+            return None
+        self._count("hits", key)
+        return self._decode(*row)
+
+    def touch(self, key):
+        """Record a hit of `key` served by a cache in front of this one."""
+        self._count(None, key)
+
+    def set(self, key, value, expires=None):
+        if expires is not None and not isinstance(expires, int):
+            # datetime.timestamp is Python 3 only; naive datetimes are UTC
+            expires = calendar.timegm(expires.utctimetuple())
+        value, body = _split_body(value)
+        digest = None
+        value = self._encode(value)
+        with self._connection() as conn:
+            if body is not None:
+                digest = hashlib.sha256(body).hexdigest()
+                body = self._encode(body)
+                conn.execute(
+                    "INSERT OR IGNORE INTO bodies (digest, value, size) "
+                    "VALUES (?, ?, ?)",
+                    (digest, body, len(body)),
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO cache "
+                "(key, value, body, expires, size, accessed, hits) VALUES "
+                "(?, ?, ?, ?, ?, ?, "
+                "COALESCE((SELECT hits FROM cache WHERE key = ?), 0))",
+                (key, value, digest, expires, len(value), time.time(), key),
+            )
+            self._collect_bodies(conn)
+        if self.max_size:
+            with self._lock:
+                self._sets += 1
+                check = self._sets % _EVICTION_INTERVAL == 1
+            if check:
+                self.prune(self.max_size, int(self.max_size * _EVICTION_TARGET))
+
+    def delete(self, key):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._collect_bodies(conn)
+
+    def items(self):
+        for key, value, body in self._connection().execute(
+            "SELECT key, cache.value, bodies.value FROM cache "
+            "LEFT JOIN bodies ON bodies.digest = cache.body"
+        ):
+            yield key, self._decode(value, body)
+
+    def values(self):
+        for key, value in self.items():
+            yield value
+
+    def body_digest(self, key):
+        """Return the sha256 digest of the response body stored for `key`."""
+        row = (
+            self._connection()
+            .execute("SELECT body FROM cache WHERE key = ?", (key,))
+            .fetchone()
+        )
+        if row:
+            return row[0]
+
+    def aliases(self, key):
+        """Return the other keys whose response body is identical to `key`."""
+        digest = self.body_digest(key)
+        if not digest:
+            return []
+        rows = self._connection().execute(
+            "SELECT key FROM cache WHERE body = ? AND key != ? ORDER BY key",
+            (digest, key),
+        )
+        return [row[0] for row in rows]
+
+    def train_dictionary(self, samples=None, size=DICTIONARY_SIZE):
+        if not self.compressor:
+            raise ValueError("{} is not compressed".format(self.filename))
+        if samples is None:
+            samples = self.values()
+        return self.compressor.train(samples, size)
+
+    def _total_size(self, conn):
+        (size,) = conn.execute(
+            "SELECT (SELECT COALESCE(SUM(size), 0) FROM cache) "
+            "+ (SELECT COALESCE(SUM(size), 0) FROM bodies)"
+        ).fetchone()
+        return size
+
+    def prune(self, max_size, target=None):
+        """Evict entries when over `max_size` bytes, down to `target` bytes.
+
+        Returns the number of entries and bytes removed.
+        """
+        if target is None:
+            target = max_size
+        self._flush_counters()
+        conn = self._connection()
+        total = self._total_size(conn)
+        if total <= max_size:
+            return 0, 0
+
+        order = "accessed" if self.policy == "lru" else "hits, accessed"
+        keys = []
+        freed = 0
+        refs = {}
+        for key, size, digest, body_size, body_refs in conn.execute(
+            "SELECT key, cache.size, body, bodies.size, bodies.refs FROM cache "
+            "LEFT JOIN bodies ON bodies.digest = cache.body ORDER BY " + order
+        ):
+            if total - freed <= target:
+                break
+            keys.append((key,))
+            freed += size
+            if digest:
+                refs[digest] = refs.get(digest, body_refs) - 1
+                if not refs[digest]:
+                    freed += body_size
+        with conn:
+            conn.executemany("DELETE FROM cache WHERE key = ?", keys)
+            self._collect_bodies(conn)
+        return len(keys), freed
+
+    def stats(self):
+        self._flush_counters()
+        conn = self._connection()
+        (entries,) = conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        (bodies,) = conn.execute("SELECT COUNT(*) FROM bodies").fetchone()
+        stats = {
+            "entries": entries,
+            "bodies": bodies,
+            "size": self._total_size(conn),
+            "hits": 0,
+            "misses": 0,
+        }
+        stats.update(conn.execute("SELECT name, value FROM counters"))
+        stats["file_size"] = self.file_size()
+        return stats
+
+    def integrity_check(self):
+        (result,) = self._connection().execute("PRAGMA quick_check").fetchone()
+        return result == "ok"
+
+    def compact(self):
+        """Reclaim unused space, returning the number of bytes freed."""
+        before = self.file_size()
+        conn = self._connection()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+        return before - self.file_size()
+
+    def file_size(self):
+        size = 0
+        for suffix in ("", "-wal"):
+            try:
+                size += os.path.getsize(self.filename + suffix)
+            except OSError:
+                pass
+        return size
+
+    def close(self):
+        self._flush_counters()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class _NoLock(object):
+    def __init__(self, path):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class AtomicFileCache(FileCache):
+    """FileCache which is safe across processes without lock files.
+
+    Values are written to a temporary file beside the entry and renamed
+    over it, so readers see either the old or the new value, and a crashed
+    writer leaves at most a temporary file which `compact` removes.
+
+    Only the public FileCache methods are used, so CacheControl 0.12, which
+    still requires lockfile for its unused locks, is also supported.
+    """
+
+    def __init__(self, directory, **kwargs):
+        kwargs.setdefault("lock_class", _NoLock)
+        super(AtomicFileCache, self).__init__(directory, **kwargs)
+
+    def set(self, key, value, expires=None):
+        self._write_atomic(self._fn(key), value)
+
+    def _write_atomic(self, path, data):
+        dirname = os.path.dirname(path)
+        try:
+            os.makedirs(dirname, self.dirmode)
+        except OSError:
+            if not os.path.isdir(dirname):
+                raise
+
+        fd, name = tempfile.mkstemp(suffix=_TEMPORARY_SUFFIX, dir=dirname)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.chmod(name, self.filemode)
+            _replace(name, path)
+        except BaseException:
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+            raise
+
+    def compact(self, max_age=_STALE_TEMPORARY_AGE):
+        """Remove lock files and temporary files of abandoned writes.
+
+        Returns the number of bytes freed.
+        """
+        freed = 0
+        cutoff = time.time() - max_age
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if not filename.endswith((".lock", _TEMPORARY_SUFFIX)):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                    if filename.endswith(_TEMPORARY_SUFFIX) and stat.st_mtime > cutoff:
+                        continue  # may still be being written
+                    os.remove(path)
+                except OSError:
+                    continue
+                freed += stat.st_size
+        return freed
+
+
+class BoundedFileCache(AtomicFileCache):
+    """FileCache which removes the least recently used files over `max_size`."""
+
+    def __init__(self, directory, max_size=None, **kwargs):
+        super(BoundedFileCache, self).__init__(directory, **kwargs)
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._sets = 0
+
+    def set(self, key, value, expires=None):
+        super(BoundedFileCache, self).set(key, value, expires=expires)
+        if self.max_size:
+            with self._lock:
+                self._sets += 1
+                check = self._sets % _EVICTION_INTERVAL == 1
+            if check:
+                prune_cache(self, self.max_size, int(self.max_size * _EVICTION_TARGET))
+
+    def touch(self, key):
+        """Record a hit of `key` served by a cache in front of this one."""
+        if self.max_size:
+            try:
+                os.utime(self._fn(key), None)
+            except OSError:
+                pass
+
+
+def _iter_file_cache_entries(directory):
+    for dirpath, dirnames, filenames in os.walk(directory):
+        if dirpath == directory:
+            continue  # only entries are nested, see FileCache._fn
+        for filename in filenames:
+            if filename.endswith((".lock", _TEMPORARY_SUFFIX)):
+                continue
+            yield os.path.join(dirpath, filename)
+
+
+def _unwrap(cache):
+    while isinstance(cache, (CompressedCache, LayeredCache, MemoryCache)):
+        cache = cache.cache
+    return cache
+
+
+def iter_cache_values(cache):
+    """Yield the stored values of a FileCache or SQLiteCache."""
+    cache = _unwrap(cache)
+    if hasattr(cache, "values"):
+        for value in cache.values():
+            yield value
+        return
+    for path in _iter_file_cache_entries(cache.directory):
+        with open(path, "rb") as f:
+            yield f.read()
+
+
+def cache_stats(cache):
+    """Return entry count, size and, where recorded, hits and misses."""
+    cache = _unwrap(cache)
+    if hasattr(cache, "stats"):
+        return cache.stats()
+    entries = size = 0
+    for path in _iter_file_cache_entries(cache.directory):
+        entries += 1
+        size += os.path.getsize(path)
+    return {"entries": entries, "size": size}
+
+
+def prune_cache(cache, max_size, target=None):
+    """Evict entries of `cache` when over `max_size` bytes.
+
+    Files of a FileCache are removed by oldest access time.
+    Returns the number of entries and bytes removed.
+    """
+    cache = _unwrap(cache)
+    if hasattr(cache, "prune"):
+        return cache.prune(max_size, target)
+    if target is None:
+        target = max_size
+
+    entries = []
+    for path in _iter_file_cache_entries(cache.directory):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((max(stat.st_atime, stat.st_mtime), stat.st_size, path))
+    total = sum(entry[1] for entry in entries)
+    if total <= max_size:
+        return 0, 0
+
+    removed = freed = 0
+    for accessed, size, path in sorted(entries):
+        if total - freed <= target:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        removed += 1
+        freed += size
+    return removed, freed
+
+
+def _is_valid_entry(cache, value):
+    if isinstance(cache, CompressedCache):
+        value = cache._decompress(value)
+    if not value or not value.startswith(_ENTRY_PREFIX):
+        return False
+    try:
+        msgpack.loads(value[len(_ENTRY_PREFIX) :], raw=False)
+    except Exception:
+        return False
+    return True
+
+
+def verify_cache(cache, delete=False):
+    """Check every entry can be decoded, optionally deleting invalid ones.
+
+    Returns the number of entries checked and the number invalid.
+    """
+    inner = _unwrap(cache)
+    if hasattr(inner, "integrity_check") and not inner.integrity_check():
+        raise ValueError("{} is corrupt".format(inner.filename))
+
+    if hasattr(inner, "items"):
+        entries = list(inner.items())
+    else:
+        entries = []
+        for path in _iter_file_cache_entries(inner.directory):
+            with open(path, "rb") as f:
+                entries.append((path, f.read()))
+
+    invalid = [key for key, value in entries if not _is_valid_entry(cache, value)]
+    if delete:
+        for key in invalid:
+            if hasattr(inner, "items"):
+                inner.delete(key)
+            else:
+                os.remove(key)
+    return len(entries), len(invalid)
+
+
+class CompressedCache(BaseCache):
+    """Cache wrapper compressing values with a Compressor.
+
+    Entries written with a different dictionary are treated as missing.
+    """
+
+    def __init__(self, cache, compressor=None):
+        self.cache = cache
+        self.compressor = compressor or Compressor()
+
+    def __getattr__(self, name):
+        if name == "cache":
+            raise AttributeError(name)
+        return getattr(self.cache, name)
+
+    @property
+    def codec(self):
+        return self.compressor.codec
+
+    def _decompress(self, value):
+        return self.compressor.decompress(value)
+
+    def get(self, key):
+        return self._decompress(self.cache.get(key))
+
+    def set(self, key, value, expires=None):
+        self.cache.set(key, self.compressor.compress(value), expires=expires)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def close(self):
+        self.cache.close()
+
+    def train_dictionary(self, samples=None, size=DICTIONARY_SIZE):
+        """Build and save a dictionary from `samples`, or the cached values.
+
+        Existing entries compressed with the previous dictionary become
+        cache misses.
+        """
+        if samples is None:
+            samples = (self._decompress(value) for value in iter_cache_values(self))
+        return self.compressor.train(samples, size)
+
+
+class MemoryCache(BaseCache):
+    """In-process LRU of values, bounded by bytes, in front of `cache`.
+
+    Values are held after decompression, so hits do not touch `cache`.
+    When `cache` evicts entries, the keys hit in memory are passed to its
+    `touch` before each write, which is when it evicts.
+    """
+
+    def __init__(self, cache, max_size):
+        self.cache = cache
+        self.max_size = max_size
+        self._entries = LRUCache(maxsize=max_size, getsizeof=len)
+        self._lock = threading.Lock()
+        self._touched = set()
+        self._touch = None
+        if getattr(cache, "max_size", None):
+            self._touch = getattr(cache, "touch", None)
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        if name == "cache":
+            raise AttributeError(name)
+        return getattr(self.cache, name)
+
+    def _store(self, key, value):
+        with self._lock:
+            try:
+                self._entries[key] = value
+            except ValueError:  # larger than max_size
+                self._entries.pop(key, None)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self.hits += 1
+                if self._touch:
+                    self._touched.add(key)
+                return value
+            self.misses += 1
+        value = self.cache.get(key)
+        if value is not None:
+            self._store(key, value)
+        return value
+
+    def _flush_touched(self):
+        if not self._touch:
+            return
+        with self._lock:
+            touched = self._touched
+            self._touched = set()
+        for key in touched:
+            self._touch(key)
+
+    def set(self, key, value, expires=None):
+        self._flush_touched()
+        self.cache.set(key, value, expires=expires)
+        self._store(key, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._touched.discard(key)
+        self.cache.delete(key)
+
+    def close(self):
+        self._flush_touched()
+        self.cache.close()
+
+    def clear_memory(self):
+        with self._lock:
+            self._entries.clear()
+
+    def memory_stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "size": self._entries.currsize,
+            }
+
+
+class LayeredCache(BaseCache):
+    """Writable `cache` in front of a read-only `shared` cache.
+
+    Lookups use `cache`, then `shared`.  Writes and deletes only change
+    `cache`, so an entry deleted while also in `shared` remains readable.
+    """
+
+    def __init__(self, cache, shared):
+        self.cache = cache
+        self.shared = shared
+        self.shared_hits = 0
+
+    def __getattr__(self, name):
+        if name == "cache":
+            raise AttributeError(name)
+        return getattr(self.cache, name)
+
+    def get(self, key):
+        value = self.cache.get(key)
+        if value is None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.shared_hits += 1
+        return value
+
+    def set(self, key, value, expires=None):
+        self.cache.set(key, value, expires=expires)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def close(self):
+        self.cache.close()
+        self.shared.close()
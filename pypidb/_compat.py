@@ -5,6 +5,11 @@ try:
 except ImportError:  # pragma: no cover
     from urlparse import urlparse, urlsplit, urljoin, parse_qs
 
+try:
+    from urllib.request import pathname2url
+except ImportError:  # pragma: no cover
+    from urllib import pathname2url
+
 try:
     import logger_helper
 except ImportError:  # pragma: no cover
@@ -12,4 +17,12 @@ except ImportError:  # pragma: no cover
 
 PY2 = sys.version_info[0] == 2
 
-__all__ = ["PY2", "logger_helper", "urlparse", "urlsplit", "urljoin", "parse_qs"]
+__all__ = [
+    "PY2",
+    "logger_helper",
+    "pathname2url",
+    "urlparse",
+    "urlsplit",
+    "urljoin",
+    "parse_qs",
+]
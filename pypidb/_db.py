@@ -1,5 +1,9 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from logging_helper import setup_logging
 
+from ._dns import install_dns_cache
 from ._similarity import normalize
 
 logger = setup_logging()
@@ -84,7 +88,7 @@ def add_mapping(name, url):
         reverse_mappings[url.lower()] = (normalised_name, name)
 
 
-def add_failed_mapping(name, err):  # pragma: no cover
+def add_failed_mapping(name, err):
     assert isinstance(err, Exception)
     logger.info("Adding failed mapping {} = {}".format(name, err))
     normalised_name = normalize(name)
@@ -97,9 +101,19 @@ def db_clear():  # pragma: no cover
 
 
 class Database(object):
-    def __init__(self, **kwargs):
+    """Finds the source repository of PyPI packages.
+
+    `dns_cache` "persistent" or "expiring" installs a resolver caching
+    answers on disk, see install_dns_cache.  Other keyword arguments are
+    passed to Converter.
+    """
+
+    def __init__(self, dns_cache=None, **kwargs):
         from ._pypi import Converter
 
+        if dns_cache:
+            install_dns_cache(dns_cache)
+        self._converter_kwargs = kwargs
         self._converter = Converter(**kwargs)
         self.website_timeout = self._converter.website_timeout
         self.projects = {}
@@ -111,3 +125,58 @@ class Database(object):
         return url
 
     get_vcs = find_project_scm_url
+
+    def close(self):
+        self._converter.close()
+
+    def find_many(self, names, workers=8):
+        """Resolve names concurrently, yielding results as they complete.
+
+        Each result is a tuple of the name and either the URL or the
+        exception raised while resolving it.
+        """
+        from ._cache import get_file_cache_session
+        from ._pypi import Converter
+
+        kwargs = dict(self._converter_kwargs)
+        kwargs.pop("clear_db", None)
+        if not kwargs.get("session"):
+            # Shared by all workers, with a connection pool sized to match
+            kwargs["session"] = get_file_cache_session("json", pool_maxsize=workers)
+            if not kwargs.get("web_session"):
+                kwargs["web_session"] = get_file_cache_session(
+                    "web", pool_maxsize=workers
+                )
+
+        local = threading.local()
+        converters = []
+
+        def resolve(name):
+            converter = getattr(local, "converter", None)
+            if converter is None:
+                converter = local.converter = Converter(**kwargs)
+                converters.append(converter)
+            normalized_name = normalize(name)
+            try:
+                url = converter.get_vcs(normalized_name)
+            except Exception as e:
+                logger.info("find_many {}: {!r}".format(name, e))
+                return e
+            self.projects[normalized_name] = url
+            return url
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = dict(
+                    (executor.submit(resolve, name), name) for name in set(names)
+                )
+                try:
+                    for future in as_completed(futures):
+                        yield futures[future], future.result()
+                finally:
+                    # Caller stopped consuming; drop lookups not yet started
+                    for future in futures:
+                        future.cancel()
+        finally:
+            for converter in converters:
+                converter.close()
@@ -0,0 +1,170 @@
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import diskcache
+import dns_cache.expiration
+from cachetools import TTLCache
+from dns.exception import DNSException
+from dns.resolver import Cache
+from dns_cache import NO_EXPIRY, override_system_resolver
+from dns_cache.diskcache import DiskCache
+from dns_cache.resolver import NXAnswer
+from logging_helper import setup_logging
+
+from ._compat import urlsplit
+
+logger = setup_logging()
+
+PREFETCH_WORKERS = 16
+
+DNS_CACHE_MODES = ("persistent", "expiring")
+DNS_TTL = int(os.getenv("PYPIDB_DNS_TTL", 7 * 24 * 60 * 60))
+DNS_NEGATIVE_TTL = int(os.getenv("PYPIDB_DNS_NEGATIVE_TTL", 24 * 60 * 60))
+DNS_CACHE_MAX_SIZE = int(os.getenv("PYPIDB_DNS_CACHE_MAX_SIZE", 64 * 1024 ** 2))
+
+# Whether each hostname resolved, briefly, so a lookup and the checks
+# which follow it share one resolution
+_MEMO_TTL = 5 * 60
+_results = TTLCache(maxsize=100000, ttl=_MEMO_TTL)
+_lock = threading.Lock()
+_installed = None
+
+
+def get_hostname(url):
+    """Return the hostname of `url`, which may be without a scheme."""
+    if "://" not in url:
+        url = "http://" + url
+    try:
+        return urlsplit(url).hostname
+    except ValueError:
+        return None
+
+
+def resolve_hostname(hostname):
+    """Return whether `hostname` resolves, looking it up only once."""
+    with _lock:
+        result = _results.get(hostname)
+    if result is None:
+        try:
+            socket.gethostbyname(hostname)
+            result = True
+        except Exception as e:
+            logger.info("domain {} lookup error: {}".format(hostname, e))
+            result = False
+        with _lock:
+            _results[hostname] = result
+    return result
+
+
+def prefetch_hostnames(hostnames, workers=PREFETCH_WORKERS):
+    """Resolve `hostnames` concurrently, so later lookups are memory hits.
+
+    Lookups go through the system resolver, so with install_dns_cache
+    they also fill the dns cache namespace.
+    """
+    with _lock:
+        pending = set(
+            hostname for hostname in hostnames if hostname and hostname not in _results
+        )
+    if len(pending) < 2:
+        for hostname in pending:
+            resolve_hostname(hostname)
+        return
+    with ThreadPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+        list(executor.map(resolve_hostname, pending))
+
+
+class NoExpirationDiskCache(DiskCache, dns_cache.expiration.NoExpirationCache):
+    pass
+
+
+class ExpiringDiskCache(Cache):
+    """dnspython cache in a diskcache, with expiry by kind of answer.
+
+    Answers are kept for `ttl` seconds, and NXDOMAIN and other failures
+    for `negative_ttl` seconds, regardless of the record TTLs.  The least
+    recently stored entries are evicted over `max_size` bytes.
+    """
+
+    def __init__(
+        self,
+        directory,
+        ttl=DNS_TTL,
+        negative_ttl=DNS_NEGATIVE_TTL,
+        max_size=DNS_CACHE_MAX_SIZE,
+    ):
+        super(ExpiringDiskCache, self).__init__()
+        self.data = diskcache.Cache(directory, size_limit=max_size)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.data.get(key)
+            if value is not None and value.expiration <= time.time():
+                # Entries of the persistent mode have no diskcache expiry
+                self.data.delete(key)
+                value = None
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if isinstance(value, (NXAnswer, DNSException)):
+            ttl = self.negative_ttl
+        else:
+            ttl = self.ttl
+        value.expiration = time.time() + ttl
+        with self.lock:
+            self.data.set(key, value, expire=ttl)
+
+    def flush(self, key=None):
+        with self.lock:
+            if key is None:
+                self.data.clear()
+            else:
+                self.data.delete(key)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.data),
+                "size": self.data.volume(),
+            }
+
+
+def install_dns_cache(mode="expiring", directory=None, **kwargs):
+    """Replace the system resolver with one caching answers on disk.
+
+    `mode` "persistent" keeps every answer for a week, and "expiring" uses
+    an ExpiringDiskCache created with `kwargs`.  This changes hostname
+    resolution for the whole process; installing the mode already
+    installed returns its cache.
+    """
+    global _installed
+    from ._cache import cache_subdir
+
+    if mode not in DNS_CACHE_MODES:
+        raise ValueError("Unknown dns cache mode {}".format(mode))
+    directory = directory or cache_subdir("dns")
+    with _lock:
+        if _installed and _installed[0] == (mode, directory) and not kwargs:
+            return _installed[1]
+        if mode == "persistent":
+            dns_cache.expiration.MIN_TTL = NO_EXPIRY
+            cache = NoExpirationDiskCache(directory=directory, min_ttl=NO_EXPIRY)
+        else:
+            cache = ExpiringDiskCache(directory, **kwargs)
+        override_system_resolver(cache=cache)
+        _installed = (mode, directory), cache
+        _results.clear()
+    return cache
@@ -10,6 +10,10 @@ class UnrecognisedStdlibBackport(InvalidPackage):
     pass
 
 
+class PackageNotInLocalMetadata(InvalidPackage):
+    pass
+
+
 class IncompletePackageMetadata(ValueError):
     pass
 
@@ -5,7 +5,9 @@ def get_html_hrefs(content, source_url, only_unique=False, ignore="github.io"):
     from lxml import html
 
     urls = []
-    tree = html.fromstring(content.encode("utf-8"))
+    if not isinstance(content, bytes):
+        content = content.encode("utf-8")
+    tree = html.fromstring(content)
     for e in tree.xpath("//*[@href]"):
         link = e.attrib.get("href")
         if len(link) < 2:
@@ -1,6 +1,7 @@
+import requests
 from logging_helper import setup_logging
 
-from ._cache import get_file_cache
+from ._cache import cached_lookup, get_file_cache
 from ._compat import urlsplit
 
 _lp_client = None
@@ -21,14 +22,24 @@ def _get_lp():
     return _lp_client
 
 
+def _check_response(r):
+    """Raise for failures which may succeed later, so they are not cached."""
+    if r.status_code >= 500:
+        r.raise_for_status()
+
+
+@cached_lookup
 def _launchpad_bug(bug_id):
     lp_client = _get_lp()
     try:
         r = lp_client.get_bug_tasks(bug_id)
+    except requests.RequestException:
+        raise
     except Exception as e:  # pragma: no cover
         logger.error("_launchpad_bug: {}".format(e))
         return
 
+    _check_response(r)
     if not r:  # pragma: no cover
         return
     data = r.json()
@@ -36,6 +47,7 @@ def _launchpad_bug(bug_id):
     return _launchpad("https://launchpad.net/{}".format(project1))
 
 
+@cached_lookup
 def _launchpad(url):
     p = urlsplit(url)
     subdomain = p.netloc.split(".")[0]
@@ -71,9 +83,12 @@ def _launchpad(url):
     lp_client = _get_lp()
     try:
         r = lp_client.get_project(name)
+    except requests.RequestException:
+        raise
     except Exception as e:
         logger.error("_launchpad: {}".format(e))
         return
+    _check_response(r)
     if not r:
         return
     data = r.json()
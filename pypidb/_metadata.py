@@ -0,0 +1,97 @@
+import json
+import os
+import os.path
+import threading
+
+from logging_helper import setup_logging
+
+from ._similarity import normalize
+
+logger = setup_logging()
+
+
+class MirrorMetadataSource(object):
+    """PyPI JSON metadata from a local directory of ``<name>/json`` files.
+
+    This is the layout of the ``web/pypi`` directory of a bandersnatch
+    mirror.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def get_package_json(self, name):
+        for candidate in (name, normalize(name)):
+            filename = os.path.join(self.directory, candidate, "json")
+            try:
+                with open(filename, "rb") as f:
+                    content = f.read()
+            except (IOError, OSError):
+                continue
+            logger.debug("{}: metadata from {}".format(name, filename))
+            return json.loads(content.decode("utf-8"))
+
+
+class JsonLinesMetadataSource(object):
+    """PyPI JSON metadata from a dump with one package document per line.
+
+    The byte offset of each package is indexed on first use, and the index
+    is saved next to the dump so it is only rebuilt when the dump changes.
+    """
+
+    def __init__(self, filename, index_filename=None):
+        self.filename = filename
+        self.index_filename = index_filename or filename + ".idx"
+        self._index = None
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _stamp(self):
+        stat = os.stat(self.filename)
+        return [stat.st_size, int(stat.st_mtime)]
+
+    def _load_index(self):
+        stamp = self._stamp()
+        try:
+            with open(self.index_filename) as f:
+                saved = json.load(f)
+            if saved["stamp"] == stamp:
+                return saved["offsets"]
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+        logger.info("indexing {}".format(self.filename))
+        offsets = {}
+        with open(self.filename, "rb") as f:
+            offset = 0
+            for line in f:
+                if line.strip():
+                    data = json.loads(line.decode("utf-8"))
+                    offsets[normalize(data["info"]["name"])] = offset
+                offset += len(line)
+
+        try:
+            with open(self.index_filename, "w") as f:
+                json.dump({"stamp": stamp, "offsets": offsets}, f)
+        except (IOError, OSError) as e:
+            logger.warning("could not save {}: {}".format(self.index_filename, e))
+        return offsets
+
+    def get_package_json(self, name):
+        with self._lock:
+            if self._index is None:
+                self._index = self._load_index()
+            offset = self._index.get(normalize(name))
+            if offset is None:
+                return
+            if self._file is None:
+                self._file = open(self.filename, "rb")
+            self._file.seek(offset)
+            line = self._file.readline()
+        return json.loads(line.decode("utf-8"))
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
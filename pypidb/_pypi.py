@@ -1,5 +1,6 @@
 import json
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from fake_useragent import UserAgent
@@ -9,22 +10,31 @@ from socialregexes import identify
 from socialregexes.socialregexes import definitions as social_definitions
 from stdlib_list import stdlib_list
 
-from ._cache import _check_url_domain, get_file_cache_session, get_timeout
-from ._db import _fetch_mapping, add_mapping, db_clear, mappings
+from ._cache import (
+    _check_url_domain,
+    get_file_cache_session,
+    get_timeout,
+    prefetch_url_domains,
+)
+from ._db import _fetch_mapping, add_failed_mapping, add_mapping, db_clear, mappings
 from ._exceptions import (
     IncompletePackageMetadata,
     InvalidPackage,
     InvalidPackageVersion,
+    PackageNotInLocalMetadata,
     PackageWithoutFiles,
     PackageWithoutUrls,
     UnrecognisedStdlibBackport,
 )
 from ._github import normalize
+from ._html import get_html_hrefs
+from ._pypi_json import parse_package_json
 from ._rtd import get_repo as get_rtd_repo
 from ._rules import DefaultRule, _find_named_repo, rules
 from ._scm_url_cleaner import SCMURLCleaner
 from ._similarity import _compute_similarity, get_best_match
 from ._stdlib import ALLOWED_STDLIB_BACKPORTS
+from ._store import CACHED_FAILURES, UNCACHED_FAILURES
 from ._types import Email, Name, Text, Url, UrlSet, Webpage
 
 try:
@@ -70,14 +80,19 @@ class Converter(object):
     def __init__(
         self,
         session=None,
+        web_session=None,
         repo_url="https://pypi.org/pypi",
         website_timeout=13,
         max_fetches=None,
         clear_db=False,
         store_fetch_list=False,
+        parallel_fetches=None,
+        store=None,
+        metadata_source=None,
+        offline_metadata=False,
     ):
         self.session = session
-        self.web_session = session
+        self.web_session = web_session or session
         self._cleaner = SCMURLCleaner()
         self.repo_url = repo_url
         self.website_timeout = website_timeout
@@ -85,9 +100,24 @@ class Converter(object):
         self.max_distance = 0.2
         self._store_fetch_list = store_fetch_list
         self.headers = _DEFAULT_HEADERS
+        self._parallel_fetches = parallel_fetches
+        self._executor = None
+        self._store = store
+        self._metadata_source = metadata_source
+        self._offline_metadata = offline_metadata
         if clear_db:
             db_clear()
 
+    def close(self):
+        """Stop the workers fetching pages in parallel."""
+        executor = getattr(self, "_executor", None)
+        if executor is not None:
+            self._executor = None
+            executor.shutdown(wait=False)
+
+    def __del__(self):
+        self.close()
+
     def _get(self, *path):
         if self.session is None:
             self.session = get_file_cache_session("json")
@@ -106,17 +136,31 @@ class Converter(object):
             )
 
     def _get_package_json(self, name):
+        if self._metadata_source:
+            data = self._metadata_source.get_package_json(name)
+            if data:
+                return data
+        if self._offline_metadata:
+            raise PackageNotInLocalMetadata(
+                "Package {} not in local metadata".format(name)
+            )
+
         response = self._get("{0}/json".format(name))
         if response.status_code == 404:
             raise InvalidPackage("Invalid package name {}".format(name))
         else:
-            data = json.loads(response.text)
+            try:
+                data = parse_package_json(response.content)
+            except ValueError:
+                # Not an object; PyPI JSON is utf-8, and response.text
+                # would detect the charset
+                data = json.loads(response.content.decode("utf-8"))
             if not data:
                 raise InvalidPackage("Invalid package data for name {}".format(name))
             return data
 
-    def _accept_url(self, rule, name, url):
-        url = self._cleaner.get_root(url)
+    def _accept_url(self, rule, name, url, root=None):
+        url = root if root is not None else self._cleaner.get_root(url)
         if not url:
             return url
 
@@ -172,6 +216,92 @@ class Converter(object):
                 new_urls.add(url[:hash_pos])
         return new_urls
 
+    def _get_web_session(self):
+        if self.web_session is None:
+            self.web_session = get_file_cache_session("web")
+        return self.web_session
+
+    def _get_fetch_url(self, rule, name, url):
+        if url.startswith("https://github.com") or url.startswith(
+            "http://github.com"
+        ):  # see github rule below
+            if ".github.com" not in url:
+                logger.debug("queue loop skipping github {}".format(url))
+                return
+
+        user = identify(url)
+        if user:
+            logger.info("{} detected as social for {}".format(url, user))
+            return
+
+        rv = rule.reject_url(name, url.lower())
+        logger.debug("reject rule {}: {}".format(url, rv))
+        if rv in ["", None]:
+            return
+        if rv is True:
+            return
+
+        if (
+            "github.com" in url and ".github.com" not in url
+        ):  # yara, pykalman, membrete, zvmcloudconnector
+            logger.debug("queue loop skipping github v2 {}".format(url))
+            return
+
+        if url.startswith("git://"):  # TODO: create tidy phase
+            url = url[6:]
+
+        if not url.startswith("http://") and not url.startswith("https://"):
+            if "/" not in url:
+                url = "http://" + url + "/"
+            elif "://" not in url:
+                url = "http://" + url
+
+        return url
+
+    def _fetch_url(self, url):
+        try:
+            logger.info("r {}".format(url))
+            r = self.web_session.get(
+                url, headers=self.headers, timeout=get_timeout(url)
+            )
+            logger.debug(
+                "r {}.url {} elapsed {}".format(r.__class__.__name__, r.url, r.elapsed)
+            )
+            logger.debug("r {} headers: {}".format(r.url, r.headers))
+            r.raise_for_status()
+        except Exception as e:
+            logger.warning("{}: {}".format(url, e))
+            return
+        return r
+
+    def _prefetch(self, rule, name, current, queue, fetch_list, pending, budget):
+        """Start fetching queued urls while earlier items are processed.
+
+        Responses are still consumed in queue order, so the result is the
+        same as fetching one url at a time.
+        """
+        slots = min(self._parallel_fetches - 1, budget) - len(pending)
+        for item in queue:
+            if slots <= 0:
+                break
+            if not isinstance(item, Url) or item.value in fetch_list:
+                continue
+            url = self._get_fetch_url(rule, name, item.value)
+            if not url or url == current or url in pending:
+                continue
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._parallel_fetches
+                )
+            logger.debug("prefetching {}".format(url))
+            pending[url] = self._executor.submit(self._fetch_url, url)
+            slots -= 1
+
+    def _cancel_pending(self, pending):
+        for future in pending.values():
+            future.cancel()
+        pending.clear()
+
     def _check_metadata(self, data):
         project_info = data["info"]
         name = project_info["name"]
@@ -258,6 +388,7 @@ class Converter(object):
 
         if urls:
             urls_pre_dns = self._exclude_non_urls(urls)
+            prefetch_url_domains(urls_pre_dns)
             urls = set(url for url in urls_pre_dns if _check_url_domain(url))
             if urls_pre_dns != urls:
                 logger.info(
@@ -306,6 +437,7 @@ class Converter(object):
         seen_list = []
         fetch_count = 0
         queue = inputs[:]
+        pending = {}
 
         logger.debug("queue {}".format(queue))
 
@@ -339,8 +471,9 @@ class Converter(object):
                 fetch_urls = []
                 result_urls = []
 
+                roots = self._cleaner.clean_many(urls)
                 for url in urls:
-                    rv = self._accept_url(rule, name, url)
+                    rv = self._accept_url(rule, name, url, roots[url])
                     if rv:
                         results.append(rv)
                         result_urls.append(rv)
@@ -372,7 +505,10 @@ class Converter(object):
                     logger.info("Not processing text from {}".format(item.source))
                     continue
 
-                text = item.value
+                if isinstance(item, Webpage) and rule.link_extract is get_html_hrefs:
+                    text = item.content  # lxml decodes the bytes itself
+                else:
+                    text = item.value
                 if not text:
                     continue
                 try:
@@ -404,62 +540,35 @@ class Converter(object):
                     logger.debug("queue loop skipping already fetched {}".format(url))
                     continue
 
-                if url.startswith("https://github.com") or url.startswith(
-                    "http://github.com"
-                ):  # see github rule below
-                    if ".github.com" not in url:
-                        logger.debug("queue loop skipping github {}".format(url))
-                        continue
-
                 if fetch_count > max_fetch_count:
                     logger.debug(
                         "queue loop skipping >{}: {}".format(max_fetch_count, url)
                     )
                     continue
 
-                user = identify(url)
-                if user:
-                    logger.info("{} detected as social for {}".format(url, user))
-                    continue
-
-                rv = rule.reject_url(name, url.lower())
-                logger.debug("reject rule {}: {}".format(url, rv))
-                if rv in ["", None]:
-                    continue
-                if rv is True:
+                url = self._get_fetch_url(rule, name, url)
+                if not url:
                     continue
 
-                if (
-                    "github.com" in url and ".github.com" not in url
-                ):  # yara, pykalman, membrete, zvmcloudconnector
-                    logger.debug("queue loop skipping github v2 {}".format(url))
-                    continue
-
-                if self.web_session is None:
-                    self.web_session = get_file_cache_session("web")
-
-                if url.startswith("git://"):  # TODO: create tidy phase
-                    url = url[6:]
-
-                if not url.startswith("http://") and not url.startswith("https://"):
-                    if "/" not in url:
-                        url = "http://" + url + "/"
-                    elif "://" not in url:
-                        url = "http://" + url
-                try:
-                    logger.info("r {}".format(url))
-                    r = self.web_session.get(
-                        url, headers=self.headers, timeout=get_timeout(url)
-                    )
-                    logger.debug(
-                        "r {}.url {} elapsed {}".format(
-                            r.__class__.__name__, r.url, r.elapsed
-                        )
+                self._get_web_session()
+
+                future = pending.pop(url, None)
+                if self._parallel_fetches:
+                    self._prefetch(
+                        rule,
+                        name,
+                        url,
+                        queue,
+                        fetch_list,
+                        pending,
+                        max_fetch_count - fetch_count,
                     )
-                    logger.debug("r {} headers: {}".format(r.url, r.headers))
-                    r.raise_for_status()
-                except Exception as e:
-                    logger.warning("{}: {}".format(url, e))
+                if future:
+                    r = future.result()
+                else:
+                    r = self._fetch_url(url)
+
+                if r is None:
                     continue
 
                 urls = []
@@ -475,7 +584,7 @@ class Converter(object):
                 if urls:
                     queue.append(UrlSet(set(urls)))
 
-                if not r.text:
+                if not r.content:
                     logger.warning("{}: empty page".format(url))
                 else:
                     queue.append(Webpage(r, url))
@@ -492,6 +601,7 @@ class Converter(object):
                     if self._store_fetch_list:
                         _fetch_mapping[normalized_name] = fetch_list
 
+                    self._cancel_pending(pending)
                     return result_url
 
             if not queue and not results:
@@ -500,6 +610,7 @@ class Converter(object):
                     queue.append(Url(ph_url))
 
         logger.debug("fetched {}".format(fetch_list))
+        self._cancel_pending(pending)
         if self._store_fetch_list:
             _fetch_mapping[normalized_name] = fetch_list
 
@@ -530,6 +641,20 @@ class Converter(object):
             add_mapping(name, url)
             logger.debug("---- preloaded {} = {} ----".format(name, url))
 
+    def _get_rule(self, normalised_name, name):
+        rule = rules.get(normalised_name)
+        if not rule:
+            rule = DefaultRule(name)
+        return rule
+
+    def _get_stored(self, normalised_name, fingerprint, serial=None):
+        stored = self._store.get(normalised_name, fingerprint, serial)
+        if stored:
+            name, url = stored
+            logger.debug("{}: stored result {}".format(name, url))
+            add_mapping(name, url)
+            return url
+
     def get_vcs(self, name):
         normalised_name = normalize(name)
         logger.info("looking up {}".format(name))
@@ -539,6 +664,30 @@ class Converter(object):
                 return cached_result
             raise cached_result
 
+        fingerprint = None
+        if self._store:
+            fingerprint = self._get_rule(normalised_name, name).fingerprint()
+            err = self._store.get_failure(normalised_name, fingerprint)
+            if err:
+                logger.debug("{}: stored failure {!r}".format(name, err))
+                add_failed_mapping(name, err)
+                raise err
+
+        try:
+            return self._get_vcs(normalised_name, name, fingerprint)
+        except CACHED_FAILURES as err:
+            if not isinstance(err, UNCACHED_FAILURES):
+                add_failed_mapping(name, err)
+                if self._store:
+                    self._store.add_failure(normalised_name, err, fingerprint)
+            raise
+
+    def _get_vcs(self, normalised_name, name, fingerprint=None):
+        if self._store:
+            url = self._get_stored(normalised_name, fingerprint)
+            if url:
+                return url
+
         data = self._get_package_json(name)
         project_info = data.get("info", {})
         if not project_info:
@@ -549,9 +698,13 @@ class Converter(object):
         if not name:
             raise InvalidPackage('{} has no "name" in PyPI metadata'.format(name))
 
-        rule = rules.get(normalised_name)
-        if not rule:
-            rule = DefaultRule(name)
+        serial = data.get("last_serial")
+        if self._store:
+            url = self._get_stored(normalised_name, fingerprint, serial)
+            if url:
+                return url
+
+        rule = self._get_rule(normalised_name, name)
         logger.debug("rule {} {}".format(rule.__class__.__name__, rule))
         if rule.preload:
             self._add_mappings(rule.preload)
@@ -589,6 +742,8 @@ class Converter(object):
         assert check_url == url, "get_root({}) => {}".format(url, check_url)
 
         add_mapping(name, url)
+        if self._store:
+            self._store.add(normalised_name, name, url, fingerprint, serial)
         return url
 
     def _raise_no_result_exception(self, rule, name, data):
@@ -0,0 +1,185 @@
+import json
+import re
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# Fields of "info" read by Converter, in addition to those ending with _url
+INFO_FIELDS = (
+    "name",
+    "version",
+    "summary",
+    "description",
+    "license",
+    "author_email",
+    "maintainer_email",
+    "home_page",
+    "project_urls",
+)
+
+_WHITESPACE = re.compile(br"[ \t\n\r]*")
+_STRING = re.compile(br'"[^"\\]*(?:\\.[^"\\]*)*"')
+_SCALAR = re.compile(br"[^,:\]}\s]+")
+# The next bracket outside of a string
+_BRACKET = re.compile(
+    br'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*([\[\]{}])'
+)
+_PARSED_KEYS = ("info", "urls", "last_serial")
+
+
+def trim_package_json(data):
+    """Return PyPI JSON `data` with only the parts used by Converter.
+
+    Each release is replaced by its number of files, and only the urls
+    of the files of the current version are kept.
+    """
+    info = data.get("info") or {}
+    return {
+        "info": dict(
+            (key, value)
+            for key, value in info.items()
+            if key in INFO_FIELDS or key.endswith("_url")
+        ),
+        "last_serial": data.get("last_serial"),
+        "releases": dict(
+            (version, len(files) if isinstance(files, list) else files)
+            for version, files in (data.get("releases") or {}).items()
+        ),
+        "urls": [
+            {"url": item["url"]} if isinstance(item, dict) and "url" in item else item
+            for item in data.get("urls") or []
+        ],
+    }
+
+
+def decode_body(body, content_encoding):
+    """Return `body` without its Content-Encoding, or None if unsupported."""
+    content_encoding = (content_encoding or "identity").strip().lower()
+    if content_encoding == "identity":
+        return body
+    if content_encoding in ("gzip", "x-gzip"):
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if content_encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    if content_encoding == "br" and brotli:
+        return brotli.decompress(body)
+
+
+def trim_package_json_body(body, content_encoding=None):
+    """Return the utf-8 encoded trim_package_json of a response body.
+
+    Returns None when the body can not be decoded.
+    """
+    try:
+        body = decode_body(body, content_encoding)
+        if body is None:
+            return None
+        data = json.loads(body.decode("utf-8"))
+    except Exception:
+        return None
+    if not isinstance(data, dict) or "info" not in data:
+        return None
+    trimmed = trim_package_json(data)
+    return json.dumps(trimmed, separators=(",", ":")).encode("utf-8")
+
+
+def _skip_whitespace(content, idx):
+    return _WHITESPACE.match(content, idx).end()
+
+
+def _expect(content, idx, char):
+    idx = _skip_whitespace(content, idx)
+    if content[idx : idx + 1] != char:
+        raise ValueError("Expected {!r} at {}".format(char, idx))
+    return idx + 1
+
+
+def _skip_value(content, idx):
+    """Return the end of the value at `idx`, and its number of items.
+
+    Only items which are arrays or objects are counted, and only in an
+    array or object.
+    """
+    char = content[idx : idx + 1]
+    if char not in (b"[", b"{"):
+        match = (_STRING if char == b'"' else _SCALAR).match(content, idx)
+        if not match:
+            raise ValueError("Invalid value at {}".format(idx))
+        return match.end(), None
+
+    depth = items = 0
+    match = None
+    while True:
+        match = _BRACKET.match(content, match.end() if match else idx)
+        if not match:
+            raise ValueError("Unterminated value at {}".format(idx))
+        if match.group(1) in (b"]", b"}"):
+            depth -= 1
+            if not depth:
+                return match.end(), items
+        else:
+            if depth == 1:
+                items += 1
+            depth += 1
+
+
+def _parse_object(content, idx, parse_member):
+    """Parse the object at `idx` with `parse_member(key, idx)`.
+
+    `parse_member` returns the end of the member value and the value, or
+    None to leave the member out.  Returns the parsed object and its end.
+    """
+    result = {}
+    idx = _expect(content, idx, b"{")
+    idx = _skip_whitespace(content, idx)
+    if content[idx : idx + 1] == b"}":
+        return result, idx + 1
+    while True:
+        match = _STRING.match(content, idx)
+        if not match:
+            raise ValueError("Expected a key at {}".format(idx))
+        key = json.loads(match.group().decode("utf-8"))
+        idx = _skip_whitespace(content, _expect(content, match.end(), b":"))
+        idx, value = parse_member(key, idx)
+        if value is not None:
+            result[key] = value
+        idx = _skip_whitespace(content, idx)
+        char = content[idx : idx + 1]
+        if char == b"}":
+            return result, idx + 1
+        if char != b",":
+            raise ValueError("Expected ',' at {}".format(idx))
+        idx = _skip_whitespace(content, idx + 1)
+
+
+def parse_package_json(content):
+    """Parse utf-8 PyPI JSON `content` into its trim_package_json.
+
+    Only "info", "urls" and "last_serial" are decoded.  The files of each
+    release are counted while being skipped, so the file lists, which are
+    most of the document for large packages, are never built.
+    """
+
+    def count_files(version, idx):
+        end, files = _skip_value(content, idx)
+        if files is None:  # already trimmed
+            files = json.loads(content[idx:end].decode("utf-8"))
+        return end, files
+
+    def parse_member(key, idx):
+        if key == "releases" and content[idx : idx + 1] == b"{":
+            releases, end = _parse_object(content, idx, count_files)
+            return end, releases
+        end = _skip_value(content, idx)[0]
+        if key in _PARSED_KEYS:
+            return end, json.loads(content[idx:end].decode("utf-8"))
+        return end, None
+
+    data = _parse_object(content, 0, parse_member)[0]
+    return trim_package_json(data) if data else data
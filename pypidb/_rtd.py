@@ -1,10 +1,11 @@
 import os
+import threading
 
 from cachetools import cached, LRUCache
 from logging_helper import setup_logging
 
 from ._auth import _get_token
-from ._cache import get_file_cache
+from ._cache import cached_lookup, get_file_cache
 from ._compat import urlsplit
 from ._github import check_repo
 
@@ -35,7 +36,7 @@ class ReadtheDocs:
         """Simple query just to check connection"""
         return session.get(self.base_url)
 
-    @cached(cache=LRUCache(maxsize=12))
+    @cached(cache=LRUCache(maxsize=12), lock=threading.RLock())
     def get_project(self, name, version=None):
         if "/v2/" in self.base_url:
             url = "{}footer_html/?format=json&project={}&version=v{}".format(
@@ -46,11 +47,8 @@ class ReadtheDocs:
         logger.debug("rtd request: {}".format(url))
         response = session.get(url, headers=self.headers)
         logger.debug(response.headers)
-        try:
-            data = response.json()
-        except Exception as e:
-            logger.error("get_project: {}".format(e))
-            return
+        # an error page which is not json may be temporary, so is raised
+        data = response.json()
 
         if data == {"detail": "Invalid token."}:
             raise AuthenticationError("Invalid token")
@@ -67,7 +65,7 @@ class ReadtheDocs:
         return url
 
 
-@cached(cache=LRUCache(maxsize=12))
+@cached(cache=LRUCache(maxsize=12), lock=threading.RLock())
 def _get_repo_v2_footer(name, version="latest", dot_com=True):
     url = "https://readthedocs.{}/api/v2/footer_html/?format=json&project={}&version={}&page=index&docroot=/&source_suffix=.rst"
     url = url.format("com" if dot_com else "org", name, version)
@@ -99,6 +97,7 @@ def _get_repo_v2_footer(name, version="latest", dot_com=True):
     return url
 
 
+@cached_lookup
 def get_repo(slug, version="latest", dot_com=None, v2=None, strip_docs_suffix=True):
     if "://" in slug:
         p = urlsplit(slug)
@@ -1,15 +1,13 @@
 from functools import partial
+import hashlib
 import os.path
 
 from appdirs import user_cache_dir
 from logging_helper import setup_logging
 
-import dns_cache.expiration
-from dns_cache import NO_EXPIRY, override_system_resolver
-from dns_cache.diskcache import DiskCache
 from pypidb import __name__ as app_name
+from pypidb._version import __version__
 
-from ._cache import cache_subdir
 from ._db import multipackage_repos, reverse_mappings
 from ._exceptions import AuthorWithoutPublicRepository
 from ._patch import (
@@ -28,8 +26,6 @@ from ._similarity import normalize
 
 logger = setup_logging()
 
-dns_cache.expiration.MIN_TTL = NO_EXPIRY
-
 _azure_exclude = [
     "azure-batch-samples",
     "azure-samples",
@@ -46,15 +42,6 @@ _azure_exclude = [
 ]
 
 
-class NoExpirationDiskCache(DiskCache, dns_cache.expiration.NoExpirationCache):
-    pass
-
-
-dns_cache_dirpath = cache_subdir("dns")
-dns_cache = NoExpirationDiskCache(directory=dns_cache_dirpath, min_ttl=NO_EXPIRY)
-resolver = override_system_resolver(cache=dns_cache)
-
-
 def preload_reject_match(name, url):
     name = normalize(name)
     existing_result = reverse_mappings.get(url.lower())
@@ -136,6 +123,33 @@ class Rule(object):
     def hash(self):
         return self.key
 
+    def fingerprint(self):
+        """Digest of the rule settings, which changes when the rule changes."""
+        settings = dict(vars(self))
+        settings.pop("name")  # case may vary with the name used for lookup
+        description = "{} {} {}".format(
+            __version__,
+            self.__class__.__name__,
+            _describe(sorted(settings.items())),
+        )
+        return hashlib.sha1(description.encode("utf-8")).hexdigest()
+
+
+def _describe(value):
+    if isinstance(value, partial):
+        return "partial({}, {}, {})".format(
+            _describe(value.func),
+            _describe(value.args),
+            _describe(sorted(value.keywords.items())),
+        )
+    if callable(value):
+        return "{}.{}".format(value.__module__, value.__name__)
+    if isinstance(value, (list, tuple)):
+        return "[{}]".format(", ".join(_describe(i) for i in value))
+    if isinstance(value, dict):
+        return _describe(sorted(value.items()))
+    return repr(value)
+
 
 def xstatic_reject_match(name, url):
     if name.lower().startswith("xstatic") and "xstatic" not in url.lower():
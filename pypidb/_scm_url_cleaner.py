@@ -1,10 +1,12 @@
 import logging
+import os
+import threading
 from functools import partial
 
-from cachetools import cached, LRUCache
+from cachetools import cachedmethod, LRUCache
 from logging_helper import setup_logging
 
-from ._cache import get_file_cache
+from ._cache import LookupFailure, cached_lookup, get_file_cache
 from ._compat import PY2, logger_helper, parse_qs, urlsplit
 from ._lp import _launchpad
 from ._pagure import _pagure_io
@@ -17,24 +19,35 @@ else:  # pragma: no cover
     autolog = lambda x: x
 
 
-def _match_hostname(url, condition, require_path=None, require_no_path=False):
-    """require_path defaults to True unless match_subdomains is enabled."""
-    scheme, _, other = url.partition(":")
-    if scheme not in (
-        "git",  # lxc-python2
-        "git+https",  # asyncssh
-        "http",
-        "https",
-        "svn",  # wsgiref
-    ):
-        return False
+# Memoized results of SCMURLCleaner.get_root
+ROOT_CACHE_SIZE = int(os.getenv("PYPIDB_CLEANER_CACHE_SIZE", 4096))
 
+_SCHEMES = (
+    "git",  # lxc-python2
+    "git+https",  # asyncssh
+    "http",
+    "https",
+    "svn",  # wsgiref
+)
+
+
+def _parse_condition(condition):
     if condition.startswith("http://"):
         condition = condition[7:]
 
     hostname, _, path = condition.partition("/")
     if ":" in hostname:
         hostname = hostname.split(":", 1)[0]
+    return hostname, path
+
+
+def _match_hostname(url, condition, require_path=None, require_no_path=False):
+    """require_path defaults to True unless match_subdomains is enabled."""
+    scheme, _, other = url.partition(":")
+    if scheme not in _SCHEMES:
+        return False
+
+    hostname, path = _parse_condition(condition)
 
     if "." not in other:  # pragma: no cover
         return False  # '/dev/' in http://www.reportlab.com/
@@ -282,6 +295,7 @@ def _reject(url):
     return False
 
 
+@cached_lookup
 def _get_redirect_location(url):
     web_session = get_file_cache("web")
     if url.startswith("git+"):
@@ -296,11 +310,12 @@ def _get_redirect_location(url):
     return url
 
 
+@cached_lookup
 def _follow_rtd_get_repo(url):
     try:
         url = _get_redirect_location(url)
-    except Exception:
-        pass
+    except Exception as e:
+        logger.info("{}: not redirected: {!r}".format(url, e))
 
     return _rtd_get_repo(url)
 
@@ -554,7 +569,69 @@ def _sf(url):
     return url
 
 
+class FixerIndex(object):
+    """Table of fixers by the hostname prefix of their condition.
+
+    get returns the first fixer, in table order, whose condition matches
+    with _match_hostname, but only checks conditions whose hostname
+    starts the url, or the url without its first label for "*." ones.
+    """
+
+    def __init__(self, fixers):
+        self.fixers = fixers
+        self._hostnames = {}
+        self._subdomain_hostnames = {}
+        for order, (condition, func) in enumerate(fixers.items()):
+            hostname = _parse_condition(condition)[0]
+            index = self._hostnames
+            if hostname.startswith("*."):
+                hostname = hostname[2:]
+                index = self._subdomain_hostnames
+            index.setdefault(hostname, []).append((order, condition, func))
+        self._lengths = sorted(set(len(hostname) for hostname in self._hostnames))
+        self._subdomain_lengths = sorted(
+            set(len(hostname) for hostname in self._subdomain_hostnames)
+        )
+
+    @staticmethod
+    def _candidates(index, lengths, other):
+        for length in lengths:
+            if length > len(other):
+                break
+            for entry in index.get(other[:length], ()):
+                yield entry
+
+    def get(self, url):
+        scheme, _, other = url.partition(":")
+        if scheme not in _SCHEMES or "." not in other:
+            return None
+        other = other.lstrip("/")
+        candidates = list(self._candidates(self._hostnames, self._lengths, other))
+        candidates.extend(
+            self._candidates(
+                self._subdomain_hostnames,
+                self._subdomain_lengths,
+                other.split(".", 1)[1],
+            )
+        )
+        for order, condition, func in sorted(candidates):
+            if _match_hostname(url, condition, require_path=False):
+                return func
+
+
 class SCMURLCleaner(object):
+    """Reduces urls of projects to the url of their source repository.
+
+    Results are memoized in an LRU cache of `cache_size` entries, which by
+    default is one of $PYPIDB_CLEANER_CACHE_SIZE entries shared by all
+    cleaners.
+    """
+
+    _root_cache = LRUCache(maxsize=ROOT_CACHE_SIZE)
+    _root_lock = threading.RLock()
+    # FixerIndex of each fixers table by id, which keeps the tables alive
+    _fixer_indexes = {}
+
     fixers = {
         "raw.githubusercontent.com/": _first_two_path,
         "github.com": _github,
@@ -810,17 +887,53 @@ class SCMURLCleaner(object):
         "www.funaba.org/code": _all,
     }
 
+    def __init__(self, cache_size=None):
+        if cache_size is not None:
+            self._root_cache = LRUCache(maxsize=cache_size)
+            self._root_lock = threading.RLock()
+
+    def _get_fixer_index(self):
+        fixers = self.fixers
+        index = self._fixer_indexes.get(id(fixers))
+        if index is None:
+            # Shared by instances and subclasses with the same table
+            index = self._fixer_indexes.setdefault(id(fixers), FixerIndex(fixers))
+        return index
+
     def _get_fixer(self, url):
-        for host, func in self.fixers.items():
-            if _match_hostname(url, host, require_path=False):
-                return func
+        return self._get_fixer_index().get(url)
 
     @autolog
     def get_root(self, url):
-        return self._get_root(url)
+        """Return the repository url of `url`, or None.
+
+        None is also returned, without being memoized, when a lookup of
+        `url` fails.
+        """
+        try:
+            return self._get_root(url)
+        except LookupFailure as e:
+            logger.warning("get_root {}: {}".format(url, e))
+
+    def clean_many(self, urls):
+        """Return a dict of the root of each of `urls`, see get_root."""
+        roots = {}
+        for url in urls:
+            if url not in roots:
+                try:
+                    roots[url] = self._get_root(url)
+                except LookupFailure as e:
+                    logger.warning("clean_many {}: {}".format(url, e))
+                    roots[url] = None
+        return roots
 
-    @cached(cache=LRUCache(maxsize=32))
     def _get_root(self, url):
+        # Roots are memoized by fixers table, as well as by url
+        index = self._get_fixer_index()
+        return self._get_table_root(id(index.fixers), url)
+
+    @cachedmethod(lambda self: self._root_cache, lock=lambda self: self._root_lock)
+    def _get_table_root(self, table, url):
         func = self._get_fixer(url)
         if func:
             rv = func(url)
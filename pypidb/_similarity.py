@@ -1,12 +1,21 @@
 import collections
 import logging
+import os
 import re
+import threading
+from difflib import SequenceMatcher
 
 import textdistance
+from cachetools import cached, LRUCache
 from logging_helper import setup_logging
 
 from pypidb._compat import PY2, logger_helper, urlsplit
 
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
 logger = setup_logging()
 if logger_helper and not PY2:
     autolog = logger_helper.LoggerHelper(logging.getLogger(__name__), logging.DEBUG)
@@ -20,10 +29,8 @@ def normalize(name):
     return re.sub(r"[-_.]+", "-", name).lower()
 
 
-@autolog
-def _compute_similarity(name, url, algo=_similarity_func, comp_op=min):
-    name = normalize(name).replace("-", "")
-
+def _split_url(url):
+    """Return the first and second last parts of the path of `url`, and the last."""
     p = urlsplit(url)
     path = p.path
     path = path[1:]
@@ -41,52 +48,296 @@ def _compute_similarity(name, url, algo=_similarity_func, comp_op=min):
     if first.startswith("?p="):  # pragma: no cover
         first = first[3:]
 
-    logger.debug("_similarity of {} {} to {}".format(first, second, name))
-
     last = second if second else first
+    return first, second, last
+
+
+def _strip(value):
+    return value.replace("--", "-").strip("-")
+
+
+def _get_name_variants(name):
+    """Return the name side of each distance, which is compared to the url."""
+    return [
+        name,
+        name,
+        name,
+        "py" + name,
+        "py" + name,
+        name + "py",
+        name + "py",
+        name + "python",
+        name + "python",
+        name,
+        name,
+        name,
+        name,
+        name,
+        name,
+        name,
+        name,
+        "python" + name + "client",  # yubico
+        "python" + name,
+        name + "client",
+        name + "python-client",
+        name + "client-python",
+        name,
+        name,
+        name,
+        name,  # yara
+        "backports-" + name,  # https://github.com/r3m0t/backports.lzma
+        name,  # django-vz-wiki
+        "django-" + name,
+        name.replace("django", "drf"),  # django-extra-fields
+        name.replace("drf", "django"),
+        name.replace("drf", "django-rest-framework"),  # drf-jwt
+        name,
+    ]
+
 
-    results = [
-        algo(name, second),
-        algo(name, first + second),
-        algo(name, second + first),
-        algo("py" + name, second),
-        algo("py" + name, first + second),
-        algo(name + "py", second),
-        algo(name + "py", first + second),
-        algo(name + "python", second),
-        algo(name + "python", first + second),
-        algo(name, last + "python"),
-        algo(name, "python" + last),
-        algo(name, last.replace("python", "").replace("--", "-").strip("-")),
-        algo(
-            name,
-            last.replace("python", "").replace("sdk", "").replace("--", "-").strip("-"),
-        ),
-        algo(name, last.replace("sdk", "").replace("--", "-").strip("-")),
-        algo(name, last + "py"),
-        algo(name, "py" + last),
-        algo(name, "backports-" + last),
-        algo("python" + name + "client", last),  # yubico
-        algo("python" + name, last + "client"),
-        algo(name + "client", last),
-        algo(name + "python-client", last),
-        algo(name + "client-python", last),
-        algo(name, last + "python-client"),
-        algo(name, last + "client"),
-        algo(name, last + "client-python"),
-        0.1 + algo(name, last + "-ctypes"),  # yara
-        algo(
-            "backports-" + name, last + "ffi"
-        ),  # https://github.com/r3m0t/backports.lzma
-        0.1 + algo(name, "django-" + last),  # django-vz-wiki
-        0.1 + algo("django-" + name, last),
-        0.1 + algo(name.replace("django", "drf"), last),  # django-extra-fields
-        0.1 + algo(name.replace("drf", "django"), last),
-        algo(name.replace("drf", "django-rest-framework"), last),  # drf-jwt
-        algo(name, last.replace("drf", "django-rest-framework")),
+def _get_url_variants(first, second, last):
+    """Return the url side of each distance, in the order of the names."""
+    return [
+        second,
+        first + second,
+        second + first,
+        second,
+        first + second,
+        second,
+        first + second,
+        second,
+        first + second,
+        last + "python",
+        "python" + last,
+        _strip(last.replace("python", "")),
+        _strip(last.replace("python", "").replace("sdk", "")),
+        _strip(last.replace("sdk", "")),
+        last + "py",
+        "py" + last,
+        "backports-" + last,
+        last,
+        last + "client",
+        last,
+        last,
+        last,
+        last + "python-client",
+        last + "client",
+        last + "client-python",
+        last + "-ctypes",
+        last + "ffi",
+        "django-" + last,
+        last,
+        last,
+        last,
+        last,
+        last.replace("drf", "django-rest-framework"),
     ]
 
-    return comp_op(results)
+
+# Added to the distances of the variants which are less likely
+_OFFSETS = (0,) * 25 + (0.1, 0, 0.1, 0.1, 0.1, 0.1, 0, 0)
+
+
+def _ratcliff_obershelp(a, b):
+    """Return the RatcliffObershelp distance of `a` and `b` using difflib.
+
+    difflib finds the same matching blocks as textdistance, which searches
+    differently from 200 characters, without its overhead.
+    """
+    if a == b:
+        return 0
+    if not a or not b:
+        return 1
+    if max(len(a), len(b)) >= 200:
+        return _similarity_func(a, b)
+    blocks = SequenceMatcher(None, a, b, False).get_matching_blocks()
+    return 1 - 2 * sum(block.size for block in blocks) / float(len(a) + len(b))
+
+
+class PairwiseBackend(object):
+    """Compute the distance of each pair of strings with `algo`."""
+
+    def __init__(self, algo=_similarity_func):
+        self.algo = algo
+        self.distance = _ratcliff_obershelp if algo is _similarity_func else algo
+
+    def __call__(self, pairs):
+        return [self.distance(a, b) for a, b in pairs]
+
+
+class NumpyBackend(PairwiseBackend):
+    """Compute Ratcliff-Obershelp distances of many pairs at once.
+
+    The longest common substrings of a chunk of pairs are found together in
+    arrays, then those before and after each of them, and so on, choosing
+    the same substrings as difflib.  Pairs which are answered without a
+    search use PairwiseBackend.
+    """
+
+    max_cells = 4 * 1024 * 1024
+
+    def __init__(self, algo=_similarity_func):
+        if numpy is None:
+            raise ValueError("Unsupported similarity backend numpy")
+        super(NumpyBackend, self).__init__(algo)
+
+    def __call__(self, pairs):
+        results = [None] * len(pairs)
+        pending = []
+        for index, (a, b) in enumerate(pairs):
+            if (
+                self.algo is not _similarity_func
+                or a == b
+                or not a
+                or not b
+                or max(len(a), len(b)) >= 200
+            ):
+                results[index] = self.distance(a, b)
+            else:
+                pending.append(index)
+
+        pending.sort(key=lambda index: max(map(len, pairs[index])))
+        while pending:
+            width = max(map(len, pairs[pending[-1]]))
+            count = max(1, self.max_cells // (width * width))
+            chunk, pending = pending[-count:], pending[:-count]
+            matched = self._match([pairs[index] for index in chunk])
+            for index, size in zip(chunk, matched):
+                a, b = pairs[index]
+                results[index] = 1 - 2 * int(size) / float(len(a) + len(b))
+        return results
+
+    @staticmethod
+    def _encode(strings):
+        width = max(len(value) for value in strings)
+        array = numpy.array(strings, dtype="U{}".format(width))
+        return array.view(numpy.uint32).reshape(len(strings), width)
+
+    def _match(self, pairs):
+        """Return the total size of the matching blocks of each pair."""
+        a = self._encode([pair[0] for pair in pairs])
+        b = self._encode([pair[1] for pair in pairs])
+        matched = numpy.zeros(len(pairs), dtype=numpy.int64)
+        # The pair, and start and end in a and b, of each part to search
+        segments = numpy.array(
+            [(i, 0, len(x), 0, len(y)) for i, (x, y) in enumerate(pairs)],
+            dtype=numpy.int64,
+        )
+        limit = max(1, self.max_cells // (a.shape[1] * b.shape[1]))
+        while len(segments):
+            pair, a_lo, a_hi, b_lo, b_hi = segments.T
+            size, a_end, b_end = [
+                numpy.concatenate(values)
+                for values in zip(
+                    *[
+                        self._find_longest(a, b, segments[start : start + limit])
+                        for start in range(0, len(segments), limit)
+                    ]
+                )
+            ]
+            found = size > 0
+            numpy.add.at(matched, pair[found], size[found])
+            before = numpy.stack([pair, a_lo, a_end - size, b_lo, b_end - size], 1)
+            after = numpy.stack([pair, a_end, a_hi, b_end, b_hi], 1)
+            segments = numpy.concatenate([before[found], after[found]])
+            segments = segments[
+                (segments[:, 1] < segments[:, 2]) & (segments[:, 3] < segments[:, 4])
+            ]
+        return matched
+
+    @staticmethod
+    def _find_longest(a, b, segments):
+        """Return the size and ends of the longest match of each segment.
+
+        Of the longest, the one ending first in a, and then in b, is chosen,
+        like difflib.SequenceMatcher.find_longest_match.
+        """
+        pair, a_lo, a_hi, b_lo, b_hi = segments.T
+        a_positions = numpy.arange(a.shape[1])
+        b_positions = numpy.arange(b.shape[1])
+        a_inside = (a_positions >= a_lo[:, None]) & (a_positions < a_hi[:, None])
+        b_inside = (b_positions >= b_lo[:, None]) & (b_positions < b_hi[:, None])
+        equal = a[pair][:, :, None] == b[pair][:, None, :]
+        equal &= a_inside[:, :, None] & b_inside[:, None, :]
+
+        # lengths of the matches ending at each pair of positions
+        lengths = equal.astype(numpy.int16)
+        for i in range(1, a.shape[1]):
+            lengths[:, i, 1:] = (lengths[:, i - 1, :-1] + 1) * equal[:, i, 1:]
+        lengths = lengths.reshape(len(segments), -1)
+        ends = lengths.argmax(axis=1)
+        size = lengths[numpy.arange(len(segments)), ends].astype(numpy.int64)
+        a_end, b_end = numpy.divmod(ends, b.shape[1])
+        return size, a_end + 1, b_end + 1
+
+
+SIMILARITY_BACKENDS = {"python": PairwiseBackend, "numpy": NumpyBackend}
+SIMILARITY_BACKEND = os.getenv("PYPIDB_SIMILARITY_BACKEND", "python")
+
+
+def get_backend(name=None, algo=_similarity_func):
+    """Return the similarity backend `name`, by default $PYPIDB_SIMILARITY_BACKEND."""
+    name = name or SIMILARITY_BACKEND
+    if name not in SIMILARITY_BACKENDS:
+        raise ValueError("Unknown similarity backend {}".format(name))
+    return SIMILARITY_BACKENDS[name](algo)
+
+
+class SimilarityScorer(object):
+    """Compute the similarity of urls to the name of a package.
+
+    The variants of the name are prepared once, the distances of a batch of
+    urls are computed together by `backend`, and each distance and url
+    similarity is remembered.
+    """
+
+    def __init__(self, name, algo=_similarity_func, comp_op=min, backend=None):
+        self.name = normalize(name).replace("-", "")
+        self.comp_op = comp_op
+        self.backend = backend or get_backend(algo=algo)
+        self._names = _get_name_variants(self.name)
+        self._distances = {}
+        self._scores = {}
+
+    def _get_pairs(self, url):
+        first, second, last = _split_url(url)
+        logger.debug("_similarity of {} {} to {}".format(first, second, self.name))
+        return list(zip(self._names, _get_url_variants(first, second, last)))
+
+    def score_many(self, urls):
+        """Return a dict of the similarity of each of `urls`."""
+        pending = dict(
+            (url, self._get_pairs(url)) for url in set(urls) if url not in self._scores
+        )
+        missing = set()
+        for pairs in pending.values():
+            missing.update(pair for pair in pairs if pair not in self._distances)
+        missing = list(missing)
+        self._distances.update(zip(missing, self.backend(missing)))
+
+        for url, pairs in pending.items():
+            results = []
+            for offset, pair in zip(_OFFSETS, pairs):
+                distance = self._distances[pair]
+                results.append(offset + distance if offset else distance)
+            self._scores[url] = self.comp_op(results)
+        return dict((url, self._scores[url]) for url in urls)
+
+    def score(self, url):
+        return self.score_many([url])[url]
+
+
+@cached(cache=LRUCache(maxsize=64), lock=threading.RLock())
+def get_scorer(name):
+    """Return the SimilarityScorer of `name`, kept for recent names."""
+    return SimilarityScorer(name)
+
+
+@autolog
+def _compute_similarity(name, url, algo=_similarity_func, comp_op=min):
+    if algo is _similarity_func and comp_op is min:
+        return get_scorer(name).score(url)
+    return SimilarityScorer(name, algo, comp_op).score(url)
 
 
 @autolog
@@ -114,7 +365,7 @@ def _get_weighted_best(name, urls, cond):
 
 @autolog
 def _get_most_similar(name, urls):
-    data = dict((url, _compute_similarity(name, url)) for url in set(urls))
+    data = get_scorer(name).score_many(set(urls))
     logger.debug("computed similarity: {}".format(data))
 
     nearest_value = None
@@ -0,0 +1,161 @@
+import os
+import sqlite3
+import threading
+import time
+
+from logging_helper import setup_logging
+
+from . import _exceptions
+from ._cache import cache_subdir
+
+logger = setup_logging()
+
+DEFAULT_TTL = 60 * 60 * 24 * 7
+DEFAULT_FAILURE_TTL = 60 * 60 * 24 * 3
+
+CACHED_FAILURES = (_exceptions.IncompletePackageMetadata, _exceptions.InvalidPackage)
+# Failures which only describe the source of the metadata
+UNCACHED_FAILURES = (_exceptions.PackageNotInLocalMetadata,)
+
+
+class ResolutionStore(object):
+    """Persistent record of resolved project urls.
+
+    Each entry records the PyPI ``last_serial`` of the metadata it was
+    resolved from and the fingerprint of the rule used.  Entries younger
+    than ``ttl`` seconds are returned without consulting PyPI.  Older
+    entries are still used if the metadata serial is unchanged, and are
+    then renewed for another ``ttl``.  A rule change always invalidates.
+
+    Packages which could not be resolved are recorded with the exception
+    raised and the rule fingerprint, for ``failure_ttl`` seconds.
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, failure_ttl=DEFAULT_FAILURE_TTL):
+        if path is None:
+            dirpath = cache_subdir("resolved")
+            if not os.path.isdir(dirpath):
+                os.makedirs(dirpath)
+            path = os.path.join(dirpath, "resolved.sqlite")
+        self.path = path
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS resolutions ("
+                "key TEXT PRIMARY KEY, name TEXT, url TEXT, serial INTEGER, "
+                "fingerprint TEXT, expires REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS failures ("
+                "key TEXT PRIMARY KEY, error TEXT, message TEXT, expires REAL, "
+                "fingerprint TEXT)"
+            )
+            columns = [
+                row[1] for row in self._conn.execute("PRAGMA table_info(failures)")
+            ]
+            if "fingerprint" not in columns:
+                # failures stored before fingerprints never match
+                self._conn.execute("ALTER TABLE failures ADD COLUMN fingerprint TEXT")
+
+    def get(self, key, fingerprint, serial=None):
+        """Return the stored (name, url) for key, or None.
+
+        Without serial only unexpired entries are returned, otherwise the
+        entry is returned, and renewed, only if the serial matches.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT name, url, serial, fingerprint, expires "
+                "FROM resolutions WHERE key = ?",
+                (key,),
+            ).fetchone()
+        if not row:
+            return
+        name, url, stored_serial, stored_fingerprint, expires = row
+        if stored_fingerprint != fingerprint:
+            logger.debug("{}: stored result from a different rule".format(key))
+            return
+
+        if serial is None:
+            if expires > time.time():
+                return name, url
+            return
+
+        if stored_serial != serial:
+            logger.debug("{}: metadata changed since stored result".format(key))
+            return
+
+        logger.debug("{}: stored result renewed at serial {}".format(key, serial))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE resolutions SET expires = ? WHERE key = ?",
+                (time.time() + self.ttl, key),
+            )
+        return name, url
+
+    def add(self, key, name, url, fingerprint, serial=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO resolutions "
+                "(key, name, url, serial, fingerprint, expires) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, name, url, serial, fingerprint, time.time() + self.ttl),
+            )
+
+    def get_failure(self, key, fingerprint):
+        """Return a new instance of the exception recorded for key, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT error, message, fingerprint FROM failures "
+                "WHERE key = ? AND expires > ?",
+                (key, time.time()),
+            ).fetchone()
+        if not row:
+            return
+        error, message, stored_fingerprint = row
+        if stored_fingerprint != fingerprint:
+            logger.debug("{}: stored failure from a different rule".format(key))
+            return
+        cls = getattr(_exceptions, error, None)
+        if (
+            not isinstance(cls, type)
+            or not issubclass(cls, CACHED_FAILURES)
+            or issubclass(cls, UNCACHED_FAILURES)
+        ):
+            logger.warning("{}: unknown stored failure {}".format(key, error))
+            return
+        return cls(message)
+
+    def add_failure(self, key, err, fingerprint):
+        assert isinstance(err, CACHED_FAILURES)
+        assert not isinstance(err, UNCACHED_FAILURES)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO failures "
+                "(key, error, message, expires, fingerprint) VALUES (?, ?, ?, ?, ?)",
+                (
+                    key,
+                    err.__class__.__name__,
+                    str(err),
+                    time.time() + self.failure_ttl,
+                    fingerprint,
+                ),
+            )
+
+    def delete(self, key):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM resolutions WHERE key = ?", (key,))
+            self._conn.execute("DELETE FROM failures WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM resolutions")
+            self._conn.execute("DELETE FROM failures")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -44,11 +44,21 @@ class Text(Input):
 
 
 class Webpage(Text):
+    _text = None
+
     def __str__(self):  # pragma: no cover
         return self.value[:10] + "..."
 
     @property
-    def value(self):
+    def content(self):
         assert self._value
-        assert self._value.text
-        return self._value.text
+        return self._value.content
+
+    @property
+    def value(self):
+        # Response.text decodes, and may detect the encoding, on every access
+        if self._text is None:
+            assert self._value
+            self._text = self._value.text
+            assert self._text
+        return self._text
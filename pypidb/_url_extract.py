@@ -1,5 +1,6 @@
 import urlextract
 
+from ._dns import get_hostname, prefetch_hostnames, resolve_hostname
 from ._html import get_html_hrefs
 
 try:
@@ -11,10 +12,11 @@ MAX_URLS = 1000
 
 
 def _url_extractor_base(content):
-    try:
-        return _url_extractor.gen_urls(content, check_dns=True)
-    except Exception:
-        return _url_extractor.gen_urls(content)
+    # Equivalent to check_dns=True, with the lookups done concurrently
+    urls = list(_url_extractor.gen_urls(content))
+    hostnames = dict((url, get_hostname(url)) for url in urls)
+    prefetch_hostnames(hostnames.values())
+    return (url for url in urls if hostnames[url] and resolve_hostname(hostnames[url]))
 
 
 def _url_extractor_wrapper(content, url=None):
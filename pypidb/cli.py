@@ -4,16 +4,174 @@ import sys
 
 import click
 
+from ._bundle import BUNDLE_NAMESPACES, export_bundle, import_bundle, publish_caches
+from ._cache import (
+    CACHE_MAX_SIZE,
+    CACHE_NAMESPACES,
+    COMPRESSED_NAMESPACES,
+    get_cache,
+    parse_size,
+)
+from ._cache_backends import cache_stats, prune_cache, verify_cache
 from ._db import Database
+from ._dns import DNS_CACHE_MODES
 
 
-@click.command()
-@click.argument('name')
-def cli(name):
-    db = Database()
+class DefaultCommandGroup(click.Group):
+    """Group which runs `lookup` when the first argument is not a command.
+
+    Packages named like a command are looked up with an explicit `lookup`.
+    """
+
+    default_command = "lookup"
+
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and not args[0].startswith("-"):
+            args.insert(0, self.default_command)
+        return super(DefaultCommandGroup, self).parse_args(ctx, args)
+
+
+@click.group(cls=DefaultCommandGroup)
+def cli():
+    """Find the source repository of Python packages.
+
+    `pypidb NAME` is short for `pypidb lookup NAME`, which is needed for
+    packages named like a command, such as `pypidb lookup cache`.
+    """
+
+
+@cli.command()
+@click.argument("name")
+@click.option(
+    "--dns-cache",
+    type=click.Choice(DNS_CACHE_MODES + ("none",)),
+    default="expiring",
+    help="How hostname lookups are cached",
+)
+def lookup(name, dns_cache):
+    """Print the source repository url of package NAME."""
+    db = Database(dns_cache=None if dns_cache == "none" else dns_cache)
     try:
         url = db.find_project_scm_url(name)
         print(url)
     except Exception as e:
         error_msg = str(e)
         print(error_msg, file=sys.stderr)
+
+
+@cli.group()
+def cache():
+    """Manage the HTTP response caches."""
+
+
+@cache.command()
+@click.argument("namespaces", nargs=-1, type=click.Choice(CACHE_NAMESPACES))
+@click.option("--backend", default=None, help="Cache backend, e.g. sqlite")
+def compact(namespaces, backend):
+    """Reclaim unused space in single-file caches."""
+    for namespace in namespaces or CACHE_NAMESPACES:
+        response_cache = get_cache(namespace, backend)
+        if not hasattr(response_cache, "compact"):
+            print("{}: backend does not support compaction".format(namespace))
+            continue
+        freed = response_cache.compact()
+        response_cache.close()
+        print("{}: freed {} bytes".format(namespace, freed))
+
+
+@cache.command()
+@click.argument("namespace", type=click.Choice(COMPRESSED_NAMESPACES))
+@click.option("--backend", default=None, help="Cache backend, e.g. sqlite")
+def train(namespace, backend):
+    """Train the compression dictionary of NAMESPACE from its entries."""
+    response_cache = get_cache(namespace, backend)
+    size = response_cache.train_dictionary()
+    response_cache.close()
+    print("{}: {} byte dictionary".format(namespace, size))
+
+
+@cache.command()
+@click.argument("namespaces", nargs=-1, type=click.Choice(CACHE_NAMESPACES))
+@click.option("--backend", default=None, help="Cache backend, e.g. sqlite")
+def stats(namespaces, backend):
+    """Report entry counts, sizes and hit rates."""
+    for namespace in namespaces or CACHE_NAMESPACES:
+        response_cache = get_cache(namespace, backend)
+        values = cache_stats(response_cache)
+        response_cache.close()
+        line = "{}: {} entries, {} bytes".format(
+            namespace, values["entries"], values["size"]
+        )
+        if "hits" in values:
+            lookups = values["hits"] + values["misses"]
+            rate = float(values["hits"]) / lookups if lookups else 0
+            line += ", {} hits, {} misses ({:.1%} hit rate)".format(
+                values["hits"], values["misses"], rate
+            )
+        print(line)
+
+
+@cache.command()
+@click.argument("namespaces", nargs=-1, type=click.Choice(CACHE_NAMESPACES))
+@click.option("--backend", default=None, help="Cache backend, e.g. sqlite")
+@click.option("--max-size", default=None, help="Byte budget per namespace, e.g. 500M")
+def prune(namespaces, backend, max_size):
+    """Evict entries until each namespace is within its byte budget."""
+    max_size = parse_size(max_size) or CACHE_MAX_SIZE
+    if not max_size:
+        raise click.UsageError("--max-size or $PYPIDB_CACHE_MAX_SIZE is required")
+    for namespace in namespaces or CACHE_NAMESPACES:
+        response_cache = get_cache(namespace, backend)
+        removed, freed = prune_cache(response_cache, max_size)
+        response_cache.close()
+        print("{}: removed {} entries, {} bytes".format(namespace, removed, freed))
+
+
+@cache.command()
+@click.argument("namespaces", nargs=-1, type=click.Choice(CACHE_NAMESPACES))
+@click.option("--backend", default=None, help="Cache backend, e.g. sqlite")
+@click.option("--delete", is_flag=True, help="Delete invalid entries")
+def verify(namespaces, backend, delete):
+    """Check that every cached entry can be read."""
+    failed = False
+    for namespace in namespaces or CACHE_NAMESPACES:
+        response_cache = get_cache(namespace, backend)
+        checked, invalid = verify_cache(response_cache, delete=delete)
+        response_cache.close()
+        print("{}: {} entries, {} invalid".format(namespace, checked, invalid))
+        failed = failed or (invalid and not delete)
+    if failed:
+        sys.exit(1)
+
+
+@cache.command("export")
+@click.argument("filename", type=click.Path(dir_okay=False))
+@click.argument("namespaces", nargs=-1, type=click.Choice(BUNDLE_NAMESPACES))
+def export_cache(filename, namespaces):
+    """Write the caches to bundle FILENAME."""
+    manifest = export_bundle(filename, namespaces)
+    for namespace, values in sorted(manifest["namespaces"].items()):
+        print("{}: {} files".format(namespace, values["files"]))
+
+
+@cache.command()
+@click.argument("directory", type=click.Path(file_okay=False))
+@click.argument("namespaces", nargs=-1, type=click.Choice(CACHE_NAMESPACES))
+def publish(directory, namespaces):
+    """Copy the caches to DIRECTORY, for PYPIDB_SHARED_CACHE_DIR."""
+    copied = publish_caches(directory, namespaces)
+    for namespace, count in sorted(copied.items()):
+        print("{}: {} files".format(namespace, count))
+
+
+@cache.command("import")
+@click.argument("filename", type=click.Path(exists=True, dir_okay=False))
+@click.argument("namespaces", nargs=-1, type=click.Choice(BUNDLE_NAMESPACES))
+def import_cache(filename, namespaces):
+    """Merge bundle FILENAME into the caches."""
+    try:
+        added = import_bundle(filename, namespaces)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for namespace, count in sorted(added.items()):
+        print("{}: added {} entries".format(namespace, count))
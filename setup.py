@@ -53,8 +53,8 @@ setup(
         "requests[security]",
         "brotlipy",  # urllib3 optional dep
         "CacheControl",
+        'lockfile; python_version < "3.7"',  # CacheControl 0.12
         "cachetools",
-        "lockfile",
         "dns-cache",
         "diskcache",
         "fake-useragent",
@@ -68,11 +68,13 @@ setup(
         "textdistance",
         "unidiff",
         "logging-helper",
+        'futures; python_version < "3"',
     ],
     classifiers=classifiers.splitlines(),
     entry_points='''
         [console_scripts]
         pypidb=pypidb.cli:cli
     ''',
+    extras_require={"zstd": ["zstandard"], "numpy": ["numpy"]},
     tests_require=["pytest-blockage", "unittest-expander"],
 )
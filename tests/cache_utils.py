@@ -0,0 +1,64 @@
+import io
+import os.path
+import shutil
+import tempfile
+import unittest
+from email.utils import formatdate
+
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.response import HTTPResponse
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+
+class Body(io.BytesIO):
+    """Body which, like http.client.HTTPResponse, drops `fp` once read."""
+
+    fp = True
+
+    def read(self, *args):
+        data = super(Body, self).read(*args)
+        if self.tell() == len(self.getvalue()):
+            self.fp = None
+        return data
+
+
+class CacheSessionTestCase(unittest.TestCase):
+    """Test case with cache directories in a tempdir and a stubbed transport.
+
+    Subclasses implement `_send(adapter, request)`, usually returning
+    `self._response(...)`, and wrap requests in `with self._patch_send()`.
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.patcher = mock.patch(
+            "pypidb._cache.cache_subdir",
+            lambda name: os.path.join(self.tempdir, name),
+        )
+        self.patcher.start()
+        self.requests = []
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.tempdir)
+
+    def _patch_send(self):
+        def send(adapter, request, *args, **kwargs):
+            return self._send(adapter, request)
+
+        return mock.patch.object(HTTPAdapter, "send", send)
+
+    def _send(self, adapter, request):
+        raise NotImplementedError
+
+    def _response(self, adapter, request, body, headers=None, status=200):
+        self.requests.append(request.url)
+        headers = dict(headers or {}, Date=formatdate(usegmt=True))
+        raw = HTTPResponse(
+            body=Body(body), headers=headers, status=status, preload_content=False
+        )
+        return adapter.build_response(request, raw)
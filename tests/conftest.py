@@ -0,0 +1,6 @@
+from pypidb._compat import PY2
+
+collect_ignore = []
+if PY2:
+    # async def is a SyntaxError
+    collect_ignore.append("test_async.py")
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+from pypidb._adapters import HostConcurrencyLimit
+from pypidb._async import AsyncDatabase
+from pypidb._exceptions import InvalidPackage
+
+
+def _get_vcs(converter, name):
+    time.sleep(0.05)
+    if name == "does-not-exist":
+        raise InvalidPackage(name)
+    return "https://github.com/example/" + name
+
+
+class TestAsyncDatabase(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.db = AsyncDatabase(max_workers=4)
+
+    def tearDown(self):
+        self.db.close()
+        self.loop.close()
+
+    def test_get_vcs(self):
+        with mock.patch("pypidb._pypi.Converter.get_vcs", _get_vcs):
+            url = self.loop.run_until_complete(self.db.get_vcs("Foo_Bar"))
+        self.assertEqual(url, "https://github.com/example/foo-bar")
+        self.assertEqual(self.db.projects, {"foo-bar": url})
+
+        with mock.patch("pypidb._pypi.Converter.get_vcs", _get_vcs):
+            with self.assertRaises(InvalidPackage):
+                self.loop.run_until_complete(self.db.get_vcs("does-not-exist"))
+
+    @unittest.skipIf(
+        not hasattr(asyncio, "get_running_loop"), "requires Python 3.7 or later"
+    )
+    def test_running_loop(self):
+        with mock.patch("pypidb._pypi.Converter.get_vcs", _get_vcs):
+            with mock.patch("asyncio.get_event_loop", side_effect=RuntimeError):
+                url = self.loop.run_until_complete(self.db.get_vcs("foo"))
+        self.assertEqual(url, "https://github.com/example/foo")
+
+    def test_default_workers(self):
+        db = AsyncDatabase(per_host=2)
+        self.addCleanup(db.close)
+        self.assertEqual(db._converter.max_workers, 16)
+        self.assertEqual(db._converter._executor._max_workers, 16)
+
+    def test_find_many(self):
+        names = ["name{}".format(i) for i in range(20)] + ["does-not-exist"]
+
+        async def collect():
+            results = {}
+            for result in self.db.find_many(names):
+                name, url = await result
+                results[name] = url
+            return results
+
+        with mock.patch("pypidb._pypi.Converter.get_vcs", _get_vcs):
+            results = self.loop.run_until_complete(collect())
+
+        self.assertEqual(sorted(results), sorted(names))
+        self.assertEqual(results["name3"], "https://github.com/example/name3")
+        self.assertIsInstance(results["does-not-exist"], InvalidPackage)
+
+
+class TestHostConcurrencyLimit(unittest.TestCase):
+    def test_limit(self):
+        limit = HostConcurrencyLimit(2)
+        lock = threading.Lock()
+        active = {"example.com": 0, "example.org": 0}
+        peak = dict(active)
+
+        def fetch(url, host):
+            with limit.acquire(url):
+                with lock:
+                    active[host] += 1
+                    peak[host] = max(peak[host], active[host])
+                time.sleep(0.02)
+                with lock:
+                    active[host] -= 1
+
+        threads = [
+            threading.Thread(target=fetch, args=("https://{}/{}".format(host, i), host))
+            for i in range(6)
+            for host in active
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(peak, {"example.com": 2, "example.org": 2})
@@ -0,0 +1,202 @@
+import io
+import os.path
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import unittest
+
+import diskcache
+from click.testing import CliRunner
+
+from pypidb._bundle import _snapshot, export_bundle, import_bundle
+from pypidb._cache import get_cache
+from pypidb._cache_backends import Compressor, SQLiteCache
+from pypidb.cli import cli
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+
+class _NoBackup(object):
+    """sqlite3 connection of Python < 3.7, without the backup api."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if name == "backup":
+            raise AttributeError(name)
+        return getattr(self._conn, name)
+
+
+class TestBundle(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.bundle = os.path.join(self.tempdir, "bundle.tar.gz")
+        self._use("source")
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.tempdir)
+
+    def _use(self, name):
+        if getattr(self, "patcher", None):
+            self.patcher.stop()
+        root = os.path.join(self.tempdir, name)
+        self.patcher = mock.patch(
+            "pypidb._cache.cache_subdir", lambda ns: os.path.join(root, ns)
+        )
+        self.patcher.start()
+        self.root = root
+
+    def _dns_cache(self):
+        return diskcache.Cache(os.path.join(self.root, "dns"))
+
+    def _populate(self):
+        json_cache = get_cache("json", "sqlite")
+        json_cache.set("https://pypi.org/pypi/a/json", b"a")
+        json_cache.set("https://pypi.org/pypi/c/json", b"c")
+        json_cache.close()
+        get_cache("web", "file", "none").set("https://a.dev/", b"page")
+        with self._dns_cache() as dns:
+            dns.set("a.dev", "1.2.3.4")
+
+    def test_round_trip(self):
+        with mock.patch("pypidb._bundle.cache_subdir", self._subdir):
+            self._populate()
+            manifest = export_bundle(self.bundle)
+            self.assertEqual(sorted(manifest["namespaces"]), ["dns", "json", "web"])
+
+            self._use("target")
+            added = import_bundle(self.bundle)
+            self.assertEqual(added, {"json": 2, "web": 1, "dns": 1})
+            self.assertEqual(
+                get_cache("json", "sqlite").get("https://pypi.org/pypi/a/json"), b"a"
+            )
+            self.assertEqual(
+                get_cache("web", "file", "none").get("https://a.dev/"), b"page"
+            )
+            with self._dns_cache() as dns:
+                self.assertEqual(dns.get("a.dev"), "1.2.3.4")
+
+    def test_merge(self):
+        with mock.patch("pypidb._bundle.cache_subdir", self._subdir):
+            self._populate()
+            export_bundle(self.bundle)
+
+            self._use("target")
+            json_cache = get_cache("json", "sqlite")
+            json_cache.set("https://pypi.org/pypi/a/json", b"local")
+            json_cache.set("https://pypi.org/pypi/b/json", b"b")
+            json_cache.close()
+            get_cache("web", "file", "none").set("https://b.dev/", b"other")
+            with self._dns_cache() as dns:
+                dns.set("b.dev", "5.6.7.8")
+
+            added = import_bundle(self.bundle)
+            self.assertEqual(added, {"json": 1, "web": 1, "dns": 1})
+            json_cache = get_cache("json", "sqlite")
+            self.assertEqual(json_cache.get("https://pypi.org/pypi/a/json"), b"local")
+            self.assertEqual(json_cache.get("https://pypi.org/pypi/b/json"), b"b")
+            self.assertEqual(json_cache.get("https://pypi.org/pypi/c/json"), b"c")
+
+            self.assertEqual(import_bundle(self.bundle, ["web"]), {"web": 0})
+
+    def _train(self, words):
+        samples = [" ".join(words * 20).encode("utf-8")] * 10
+        os.makedirs(os.path.join(self.root, "web"))
+        for cache in (get_cache("json", "sqlite"), get_cache("web", "file")):
+            cache.train_dictionary(samples)
+            cache.close()
+
+    def test_dictionaries(self):
+        page = b"<html>" + b"page " * 100 + b"</html>"
+        for local_words in (None, ["other", "words"]):
+            self._use("source")
+            shutil.rmtree(self.root, ignore_errors=True)
+            with mock.patch("pypidb._bundle.cache_subdir", self._subdir):
+                self._train(["page", "html"])
+                json_cache = get_cache("json", "sqlite")
+                json_cache.set("https://pypi.org/pypi/a/json", b"a" * 100)
+                json_cache.close()
+                get_cache("web", "file").set("https://a.dev/", page)
+                export_bundle(self.bundle)
+
+                self._use("target")
+                shutil.rmtree(self.root, ignore_errors=True)
+                if local_words:
+                    self._train(local_words)
+                json_cache = get_cache("json", "sqlite")
+                json_cache.set("https://pypi.org/pypi/b/json", b"b" * 100)
+                json_cache.close()
+                get_cache("web", "file").set("https://b.dev/", b"local")
+
+                added = import_bundle(self.bundle, ["json", "web"])
+                self.assertEqual(added, {"json": 1, "web": 1})
+                self.assertEqual(
+                    os.path.exists(os.path.join(self.root, "web", "compression.dict")),
+                    bool(local_words),
+                )
+                json_cache = get_cache("json", "sqlite")
+                for name in ("a", "b"):
+                    self.assertEqual(
+                        json_cache.get("https://pypi.org/pypi/{}/json".format(name)),
+                        name.encode("utf-8") * 100,
+                    )
+                json_cache.close()
+                web_cache = get_cache("web", "file")
+                self.assertEqual(web_cache.get("https://a.dev/"), page)
+                self.assertEqual(web_cache.get("https://b.dev/"), b"local")
+
+    def test_snapshot_without_backup(self):
+        with mock.patch("pypidb._bundle.cache_subdir", self._subdir):
+            self._populate()
+        connect = sqlite3.connect
+        with mock.patch(
+            "pypidb._bundle.sqlite3.connect",
+            lambda *args, **kwargs: _NoBackup(connect(*args, **kwargs)),
+        ):
+            filename = _snapshot(
+                os.path.join(self.root, "json", "cache.sqlite"), self.tempdir
+            )
+        cache = SQLiteCache(filename, compressor=Compressor())
+        self.assertEqual(cache.get("https://pypi.org/pypi/a/json"), b"a")
+        self.assertEqual(cache.stats()["entries"], 2)
+        cache.close()
+
+    def test_unsafe(self):
+        with tarfile.open(self.bundle, "w:gz") as tar:
+            for name, data in [
+                ("manifest.json", b'{"format": 1, "namespaces": {"web": {}}}'),
+                ("web/../../evil", b""),
+            ]:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        with self.assertRaises(ValueError):
+            import_bundle(self.bundle)
+
+    def test_not_bundle(self):
+        with tarfile.open(self.bundle, "w:gz"):
+            pass
+        result = CliRunner().invoke(cli, ["cache", "import", self.bundle])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("Not a pypidb cache bundle", result.output)
+
+    def test_commands(self):
+        with mock.patch("pypidb._bundle.cache_subdir", self._subdir):
+            self._populate()
+            result = CliRunner().invoke(cli, ["cache", "export", self.bundle, "web"])
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertEqual(result.output, "web: 1 files\n")
+
+            self._use("target")
+            result = CliRunner().invoke(cli, ["cache", "import", self.bundle])
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertEqual(result.output, "web: added 1 entries\n")
+
+    def _subdir(self, namespace):
+        return os.path.join(self.root, namespace)
@@ -0,0 +1,670 @@
+import datetime
+import hashlib
+import multiprocessing
+import os.path
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+import msgpack
+from click.testing import CliRunner
+
+from pypidb._bundle import publish_caches
+from pypidb._cache import (
+    get_cache,
+    get_cache_policy,
+    get_file_cache_session,
+    memory_cache_stats,
+    parse_size,
+)
+from pypidb._cache_backends import (
+    AtomicFileCache,
+    BoundedFileCache,
+    CompressedCache,
+    Compressor,
+    LayeredCache,
+    MemoryCache,
+    SQLiteCache,
+    cache_stats,
+    prune_cache,
+    verify_cache,
+)
+from pypidb.cli import cli
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+
+def _stress_file_cache(args):
+    """Write and read shared keys, returning the number of torn reads."""
+    directory, worker, iterations = args
+    cache = AtomicFileCache(directory)
+    torn = 0
+    for i in range(iterations):
+        payload = "{}-{}".format(worker, i).encode() * (i % 50 + 1) * 100
+        cache.set("key{}".format(i % 10), hashlib.sha1(payload).digest() + payload)
+        value = cache.get("key{}".format((i + worker) % 10))
+        if value is not None and hashlib.sha1(value[20:]).digest() != value[:20]:
+            torn += 1
+    return torn
+
+
+class TestSQLiteCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, "web", "cache.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_get_set_delete(self):
+        cache = SQLiteCache(self.filename)
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", b"1")
+        self.assertEqual(cache.get("a"), b"1")
+        cache.set("a", b"2", expires=60)
+        self.assertEqual(cache.get("a"), b"2")
+        cache.set("a", b"3", expires=datetime.datetime(2020, 1, 2))
+        self.assertEqual(cache.get("a"), b"3")
+        (expires,) = (
+            cache._connection()
+            .execute("SELECT expires FROM cache WHERE key = 'a'")
+            .fetchone()
+        )
+        self.assertEqual(expires, 1577923200)
+        cache.delete("a")
+        self.assertIsNone(cache.get("a"))
+        cache.close()
+
+    def test_persistent(self):
+        cache = SQLiteCache(self.filename)
+        cache.set("a", b"1")
+        cache.close()
+        self.assertEqual(SQLiteCache(self.filename).get("a"), b"1")
+
+    def test_threads(self):
+        cache = SQLiteCache(self.filename)
+
+        def work(i):
+            for j in range(20):
+                key = "{}-{}".format(i, j)
+                cache.set(key, key.encode())
+                assert cache.get(key) == key.encode()
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(cache.get("7-19"), b"7-19")
+
+    def test_compact(self):
+        cache = SQLiteCache(self.filename)
+        for i in range(100):
+            cache.set(str(i), b"x" * 4096)
+        for i in range(100):
+            cache.delete(str(i))
+        self.assertGreater(cache.compact(), 0)
+        self.assertIsNone(cache.get("1"))
+
+    def test_stats(self):
+        cache = SQLiteCache(self.filename)
+        cache.set("a", b"123")
+        cache.get("a")
+        cache.get("b")
+        stats = cache.stats()
+        self.assertEqual(stats["entries"], 1)
+        self.assertEqual(stats["size"], 3)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_prune_lru(self):
+        cache = SQLiteCache(self.filename, max_size=1000)
+        for key in "abcd":
+            cache.set(key, b"x" * 10)
+        cache.get("a")
+        self.assertEqual(cache.prune(30), (1, 10))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+
+    def test_batched_hits(self):
+        cache = SQLiteCache(self.filename)
+        cache.set("a", b"1")
+        conn = sqlite3.connect(self.filename)
+        (accessed,) = conn.execute("SELECT accessed FROM cache").fetchone()
+        with mock.patch("time.time", return_value=time.time() + 60):
+            for i in range(3):
+                cache.get("a")
+        self.assertEqual(conn.execute("SELECT hits FROM cache").fetchone(), (0,))
+        cache.close()
+        self.assertEqual(
+            conn.execute("SELECT hits, accessed FROM cache").fetchone(), (3, accessed)
+        )
+        conn.close()
+
+    def test_prune_lfu(self):
+        cache = SQLiteCache(self.filename, policy="lfu")
+        for key in "abcd":
+            cache.set(key, b"x" * 10)
+        for key in "bcd":
+            cache.get(key)
+        cache.get("b")
+        self.assertEqual(cache.prune(20), (2, 20))
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNone(cache.get("c"))
+        self.assertIsNotNone(cache.get("b"))
+
+    def test_max_size(self):
+        cache = SQLiteCache(self.filename, max_size=1000)
+        for i in range(200):
+            cache.set(str(i), b"x" * 100)
+        self.assertLessEqual(cache.stats()["size"], 1000 + 100 * 100)
+        self.assertIsNone(cache.get("0"))
+
+    def test_verify(self):
+        cache = SQLiteCache(self.filename)
+        cache.set("a", b"cc=4," + msgpack.dumps({"response": {}}))
+        cache.set("b", b"garbage")
+        self.assertEqual(verify_cache(cache), (2, 1))
+        self.assertEqual(verify_cache(cache, delete=True), (2, 1))
+        self.assertEqual(verify_cache(cache), (1, 0))
+
+
+def _entry(body, date="Mon, 01 Jun 2020 00:00:00 GMT"):
+    data = {"response": {"body": body, "headers": {"date": date}, "status": 200}}
+    return b"cc=4," + msgpack.dumps(data, use_bin_type=True)
+
+
+class TestDeduplication(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, "cache.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _body_count(self, cache):
+        return cache.stats()["bodies"]
+
+    def test_shared_body(self):
+        cache = SQLiteCache(self.filename)
+        page = b"<html>parked</html>" * 100
+        cache.set("a", _entry(page))
+        cache.set("b", _entry(page, "Tue, 02 Jun 2020 00:00:00 GMT"))
+        cache.set("c", _entry(b"other"))
+        self.assertEqual(cache.get("a"), _entry(page))
+        self.assertEqual(cache.get("b"), _entry(page, "Tue, 02 Jun 2020 00:00:00 GMT"))
+        self.assertEqual(self._body_count(cache), 2)
+        self.assertEqual(cache.aliases("a"), ["b"])
+        self.assertEqual(cache.aliases("c"), [])
+        self.assertEqual(cache.body_digest("a"), cache.body_digest("b"))
+
+        cache.set("a", _entry(page))
+        self.assertEqual(self._body_count(cache), 2)
+        cache.delete("a")
+        self.assertEqual(cache.get("b"), _entry(page, "Tue, 02 Jun 2020 00:00:00 GMT"))
+        cache.delete("b")
+        self.assertEqual(self._body_count(cache), 1)
+
+    def test_not_reserialized(self):
+        cache = SQLiteCache(self.filename)
+        entries = [_entry(b"x" * size) for size in (1, 300, 70000)]
+        entries.append(_entry(b""))
+        entries.append(b"cc=4,garbage")
+        with mock.patch("msgpack.dumps", side_effect=AssertionError):
+            for i, entry in enumerate(entries):
+                cache.set(str(i), entry)
+        with mock.patch("msgpack.loads", side_effect=AssertionError):
+            for i, entry in enumerate(entries):
+                self.assertEqual(cache.get(str(i)), entry)
+        self.assertEqual(self._body_count(cache), 3)
+
+    def test_replace_body(self):
+        cache = SQLiteCache(self.filename)
+        cache.set("a", _entry(b"1"))
+        cache.set("a", _entry(b"2"))
+        self.assertEqual(cache.get("a"), _entry(b"2"))
+        self.assertEqual(self._body_count(cache), 1)
+
+    def test_compressed(self):
+        cache = SQLiteCache(self.filename, compressor=Compressor("zlib"))
+        page = b"<html>page</html>" * 100
+        cache.set("a", _entry(page))
+        cache.set("b", _entry(page))
+        self.assertEqual(cache.get("b"), _entry(page))
+        self.assertLess(cache.stats()["size"], len(page))
+        self.assertEqual(verify_cache(cache), (2, 0))
+
+    def test_prune(self):
+        cache = SQLiteCache(self.filename)
+        page = b"x" * 1000
+        for key in "abc":
+            cache.set(key, _entry(page))
+        removed, freed = cache.prune(1000)
+        self.assertEqual(removed, 3)
+        self.assertEqual(self._body_count(cache), 0)
+        self.assertEqual(cache.stats()["size"], 0)
+
+
+class TestMemoryCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.disk = SQLiteCache(os.path.join(self.tempdir, "cache.sqlite"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_hits(self):
+        self.disk.set("a", b"1")
+        cache = MemoryCache(self.disk, 100)
+        self.assertEqual(cache.get("a"), b"1")
+        with mock.patch.object(self.disk, "get") as disk_get:
+            self.assertEqual(cache.get("a"), b"1")
+            self.assertFalse(disk_get.called)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(
+            cache.memory_stats(), {"hits": 1, "misses": 2, "entries": 1, "size": 1}
+        )
+
+    def test_write_through(self):
+        cache = MemoryCache(self.disk, 100)
+        cache.set("a", b"1")
+        self.assertEqual(self.disk.get("a"), b"1")
+        cache.delete("a")
+        self.assertIsNone(self.disk.get("a"))
+        self.assertIsNone(cache.get("a"))
+
+    def test_touch(self):
+        disk = SQLiteCache(os.path.join(self.tempdir, "lru.sqlite"), max_size=1000)
+        cache = MemoryCache(disk, 100)
+        cache.set("a", b"x" * 10)
+        for key in "bcd":
+            disk.set(key, b"x" * 10)
+        with mock.patch.object(disk, "touch") as touch:
+            cache.get("a")  # from memory
+            self.assertFalse(touch.called)
+        cache.set("e", b"x" * 10)  # before the disk cache may evict
+        self.assertEqual(disk.prune(40), (1, 10))
+        self.assertIsNone(disk.get("b"))
+        self.assertIsNotNone(disk.get("a"))
+
+    def test_touch_file(self):
+        disk = BoundedFileCache(os.path.join(self.tempdir, "web"), max_size=1000)
+        cache = MemoryCache(disk, 100)
+        cache.set("a", b"x" * 10)
+        for key in "bcd":
+            disk.set(key, b"x" * 10)
+        os.utime(disk._fn("a"), (1000, 1000))
+        for key in "bcd":
+            os.utime(disk._fn(key), (2000, 2000))
+        cache.get("a")
+        self.assertEqual(os.stat(disk._fn("a")).st_mtime, 1000)
+        cache.close()
+        self.assertEqual(prune_cache(disk, 30), (1, 10))
+        self.assertIsNotNone(disk.get("a"))
+
+    def test_unbounded_not_touched(self):
+        cache = MemoryCache(self.disk, 100)
+        cache.set("a", b"1")
+        cache.get("a")
+        self.assertEqual(cache._touched, set())
+
+    def test_bounded(self):
+        cache = MemoryCache(self.disk, 10)
+        cache.set("a", b"x" * 6)
+        cache.set("b", b"x" * 6)
+        cache.set("c", b"x" * 11)
+        self.assertEqual(cache.memory_stats()["entries"], 1)
+        self.assertEqual(cache.get("a"), b"x" * 6)  # from disk
+        self.assertEqual(cache.memory_stats()["misses"], 1)
+
+
+class TestBoundedFileCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_prune(self):
+        cache = BoundedFileCache(self.tempdir)
+        for i in range(4):
+            cache.set(str(i), b"x" * 10)
+        self.assertEqual(cache_stats(cache), {"entries": 4, "size": 40})
+        self.assertEqual(prune_cache(cache, 20), (2, 20))
+        self.assertEqual(cache_stats(cache)["entries"], 2)
+
+    def test_verify(self):
+        cache = BoundedFileCache(self.tempdir)
+        cache.set("a", b"garbage")
+        self.assertEqual(verify_cache(cache, delete=True), (1, 1))
+        self.assertIsNone(cache.get("a"))
+
+
+class TestAtomicFileCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_no_lock_files(self):
+        cache = AtomicFileCache(self.tempdir)
+        cache.set("a", b"1")
+        cache.set("a", b"2")
+        self.assertEqual(cache.get("a"), b"2")
+        self.assertEqual(len(os.listdir(os.path.dirname(cache._fn("a")))), 1)
+        cache.delete("a")
+        self.assertIsNone(cache.get("a"))
+
+    def test_failed_write(self):
+        cache = AtomicFileCache(self.tempdir)
+        cache.set("a", b"1")
+        with mock.patch("pypidb._cache_backends._replace", side_effect=OSError):
+            with self.assertRaises(OSError):
+                cache.set("a", b"2")
+        self.assertEqual(cache.get("a"), b"1")
+        self.assertEqual(len(os.listdir(os.path.dirname(cache._fn("a")))), 1)
+
+    def test_compact(self):
+        cache = AtomicFileCache(self.tempdir)
+        cache.set("a", b"1")
+        dirname = os.path.dirname(cache._fn("a"))
+        for filename in ("stale.tmp", "new.tmp", "entry.lock"):
+            with open(os.path.join(dirname, filename), "wb") as f:
+                f.write(b"12345")
+        old = time.time() - 7200
+        os.utime(os.path.join(dirname, "stale.tmp"), (old, old))
+
+        self.assertEqual(cache.compact(), 10)
+        self.assertEqual(
+            set(os.listdir(dirname)), {"new.tmp", os.path.basename(cache._fn("a"))}
+        )
+        self.assertEqual(cache_stats(cache), {"entries": 1, "size": 1})
+
+    def test_processes(self):
+        processes = max(2, min(8, multiprocessing.cpu_count()))
+        iterations = 200
+        pool = multiprocessing.Pool(processes)
+        try:
+            start = time.time()
+            torn = pool.map(
+                _stress_file_cache,
+                [(self.tempdir, worker, iterations) for worker in range(processes)],
+            )
+            elapsed = time.time() - start
+        finally:
+            pool.close()
+            pool.join()
+
+        self.assertEqual(sum(torn), 0)
+        self.assertLess(elapsed, 60, "{} writes".format(processes * iterations))
+        cache = AtomicFileCache(self.tempdir)
+        self.assertEqual(cache_stats(cache)["entries"], 10)
+        self.assertEqual(cache.compact(max_age=0), 0)
+
+
+class TestBackendSelection(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.patcher = mock.patch(
+            "pypidb._cache.cache_subdir",
+            lambda name: os.path.join(self.tempdir, name),
+        )
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.tempdir)
+
+    def test_session(self):
+        session = get_file_cache_session("json", backend="sqlite")
+        adapter = session.get_adapter("https://pypi.org/pypi/foo/json")
+        self.assertIsInstance(adapter.cache, MemoryCache)
+        self.assertIsInstance(adapter.cache.cache, SQLiteCache)
+        self.assertIsNotNone(adapter.cache.cache.compressor)
+
+        session = get_file_cache_session("gh", backend="sqlite")
+        adapter = session.get_adapter("https://api.github.com/")
+        self.assertIsInstance(adapter.cache.cache, SQLiteCache)
+        self.assertIsNone(adapter.cache.cache.compressor)
+
+        session = get_file_cache_session("web")
+        adapter = session.get_adapter("https://example.org/")
+        self.assertIsInstance(adapter.cache.cache, CompressedCache)
+
+    def test_shared_memory_cache(self):
+        first = get_file_cache_session("json", backend="sqlite")
+        second = get_file_cache_session("json", backend="sqlite")
+        url = "https://pypi.org/pypi/foo/json"
+        self.assertIs(first.get_adapter(url).cache, second.get_adapter(url).cache)
+        self.assertIn("json", memory_cache_stats())
+
+        # the disk cache is only built once
+        with mock.patch("pypidb._cache.get_cache") as get_cache_mock:
+            third = get_file_cache_session("json", backend="sqlite")
+        self.assertFalse(get_cache_mock.called)
+        self.assertIs(third.get_adapter(url).cache, first.get_adapter(url).cache)
+
+        policy = get_cache_policy("json")
+        storage = "full" if policy.storage == "trimmed" else "trimmed"
+        for changes in ({"storage": storage}, {"max_size": 1000}):
+            other = get_file_cache_session(
+                "json", backend="sqlite", policy=policy.replace(**changes)
+            )
+            self.assertIsNot(other.get_adapter(url).cache, first.get_adapter(url).cache)
+        with mock.patch("pypidb._cache.CACHE_SHARED_DIR", self.tempdir + "-shared"):
+            other = get_file_cache_session("json", backend="sqlite")
+        self.assertIsNot(other.get_adapter(url).cache, first.get_adapter(url).cache)
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            get_cache("json", "unknown")
+
+    def test_compact_command(self):
+        get_cache("json", "sqlite").set("a", b"1")
+        runner = CliRunner()
+        result = runner.invoke(cli, ["cache", "compact", "--backend", "sqlite", "json"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("json: freed", result.output)
+
+    def test_train_command(self):
+        cache = get_cache("web", "sqlite", "zlib")
+        for i in range(10):
+            cache.set(str(i), "value {}".format(i).encode())
+        result = CliRunner().invoke(
+            cli, ["cache", "train", "--backend", "sqlite", "web"]
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.tempdir, "web", "compression.dict"))
+        )
+
+    def test_stats_command(self):
+        cache = get_cache("gh", "sqlite")
+        cache.set("a", b"1")
+        cache.get("a")
+        cache.close()
+        result = CliRunner().invoke(
+            cli, ["cache", "stats", "--backend", "sqlite", "gh"]
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("gh: 1 entries, 1 bytes, 1 hits, 0 misses", result.output)
+
+    def test_prune_command(self):
+        result = CliRunner().invoke(cli, ["cache", "prune", "gh"])
+        self.assertNotEqual(result.exit_code, 0)
+        result = CliRunner().invoke(cli, ["cache", "prune", "--max-size", "1K", "gh"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("gh: removed 0 entries", result.output)
+
+    def test_verify_command(self):
+        get_cache("gh").set("a", b"garbage")
+        result = CliRunner().invoke(cli, ["cache", "verify", "gh"])
+        self.assertEqual(result.exit_code, 1, result.output)
+        self.assertIn("gh: 1 entries, 1 invalid", result.output)
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size("10"), 10)
+        self.assertEqual(parse_size("1.5K"), 1536)
+        self.assertEqual(parse_size("2GB"), 2 * 1024 ** 3)
+        self.assertIsNone(parse_size(None))
+
+    def test_default_lookup_command(self):
+        with mock.patch("pypidb.cli.Database") as db:
+            db.return_value.find_project_scm_url.return_value = "https://a/b"
+            result = CliRunner().invoke(cli, ["foo"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(result.output.strip(), "https://a/b")
+        db.return_value.find_project_scm_url.assert_called_with("foo")
+
+    def test_lookup_command_name(self):
+        with mock.patch("pypidb.cli.Database") as db:
+            db.return_value.find_project_scm_url.return_value = "https://a/b"
+            for name in ("cache", "lookup"):
+                result = CliRunner().invoke(cli, ["lookup", name])
+                self.assertEqual(result.exit_code, 0, result.output)
+                self.assertEqual(result.output.strip(), "https://a/b")
+                db.return_value.find_project_scm_url.assert_called_with(name)
+
+
+class TestCompressedCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.inner = SQLiteCache(os.path.join(self.tempdir, "cache.sqlite"))
+        self.dictionary_filename = os.path.join(self.tempdir, "compression.dict")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _get_cache(self):
+        return CompressedCache(
+            self.inner, Compressor("zlib", self.dictionary_filename)
+        )
+
+    def test_compressed(self):
+        cache = self._get_cache()
+        value = b'cc=4,{"info": {"name": "foo"}}' * 100
+        cache.set("a", value)
+        self.assertEqual(cache.get("a"), value)
+        self.assertLess(len(self.inner.get("a")), len(value) // 10)
+
+    def test_uncompressed_value(self):
+        self.inner.set("a", b"cc=4,plain")
+        self.assertEqual(self._get_cache().get("a"), b"cc=4,plain")
+
+    def test_dictionary(self):
+        cache = self._get_cache()
+        samples = [
+            '{{"info": {{"name": "package-{}", "home_page": null}}}}'.format(i).encode()
+            for i in range(50)
+        ]
+        cache.set("old", samples[0])
+        self.assertGreater(cache.train_dictionary(samples), 0)
+        self.assertTrue(os.path.exists(self.dictionary_filename))
+
+        # Entries using another dictionary are misses
+        self.assertIsNone(cache.get("old"))
+
+        cache.set("a", samples[1])
+        self.assertEqual(cache.get("a"), samples[1])
+        self.assertEqual(self._get_cache().get("a"), samples[1])
+
+    def test_train_from_entries(self):
+        cache = self._get_cache()
+        for i in range(10):
+            cache.set(str(i), "value {}".format(i).encode())
+        cache.train_dictionary()
+        self.assertEqual(cache.get("1"), None)
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            Compressor("lzma")
+
+
+class TestLayeredCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.shared_dir = os.path.join(self.tempdir, "shared")
+        for name in ("pypidb._cache.cache_subdir", "pypidb._bundle.cache_subdir"):
+            patcher = mock.patch(
+                name, lambda name: os.path.join(self.tempdir, "local", name)
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _populate_shared(self, backend):
+        shared = get_cache("json", backend)
+        shared.set("a", b"shared a")
+        shared.set("b", b"shared b")
+        shared.close()
+        self.assertIn("json", publish_caches(self.shared_dir, ["json"]))
+        shutil.rmtree(os.path.join(self.tempdir, "local"))
+
+    def _check_layers(self, backend):
+        self._populate_shared(backend)
+        cache = get_cache("json", backend, shared_dir=self.shared_dir)
+        self.assertIsInstance(cache, LayeredCache)
+
+        self.assertEqual(cache.get("a"), b"shared a")
+        self.assertEqual(cache.shared_hits, 1)
+        self.assertIsNone(cache.get("missing"))
+
+        cache.set("a", b"local a")
+        self.assertEqual(cache.get("a"), b"local a")
+        cache.delete("b")
+        self.assertEqual(cache.get("b"), b"shared b")
+        cache.close()
+
+        shared = get_cache("json", backend, shared_dir=None)
+        self.assertIsNone(shared.get("b"))
+        self.assertEqual(shared.get("a"), b"local a")
+
+    def test_sqlite(self):
+        self._check_layers("sqlite")
+        directory = os.path.join(self.shared_dir, "json")
+        filename = os.path.join(directory, "cache.sqlite")
+        os.chmod(directory, 0o555)
+        try:
+            read_only = SQLiteCache(
+                filename, read_only=True, compressor=Compressor()
+            )
+            with self.assertRaises(sqlite3.OperationalError):
+                read_only.set("c", b"c")
+            self.assertEqual(read_only.stats()["entries"], 2)
+            self.assertEqual(read_only.get("b"), b"shared b")
+            self.assertEqual(os.listdir(directory), ["cache.sqlite"])
+        finally:
+            os.chmod(directory, 0o755)
+
+        # published again while in use
+        get_cache("json", "sqlite").set("b", b"updated b")
+        publish_caches(self.shared_dir, ["json"])
+        self.assertEqual(read_only.get("b"), b"shared b")
+        read_only.close()
+        read_only = SQLiteCache(filename, read_only=True, compressor=Compressor())
+        self.assertEqual(read_only.get("b"), b"updated b")
+        read_only.close()
+
+    def test_write_ahead_log(self):
+        filename = os.path.join(self.tempdir, "cache.sqlite")
+        SQLiteCache(filename).close()
+        with self.assertRaises(ValueError):
+            SQLiteCache(filename, read_only=True)
+
+    def test_file(self):
+        self._check_layers("file")
+
+    def test_missing_namespace(self):
+        os.makedirs(self.shared_dir)
+        cache = get_cache("json", "sqlite", shared_dir=self.shared_dir)
+        self.assertIsInstance(cache, SQLiteCache)
@@ -0,0 +1,76 @@
+import unittest
+
+from pypidb._cache import canonical_cache_url, get_file_cache_session
+from tests.cache_utils import CacheSessionTestCase
+
+
+class TestCanonicalCacheUrl(unittest.TestCase):
+    def test_variants(self):
+        expected = "https://project.dev/page"
+        for url in [
+            "https://project.dev/page",
+            "http://project.dev/page",
+            "https://www.project.dev/page",
+            "https://Project.DEV/page/",
+            "https://project.dev:443/page",
+            "https://project.dev/page?utm_source=pypi&utm_medium=web",
+            "https://project.dev/page?fbclid=abc#readme",
+        ]:
+            self.assertEqual(canonical_cache_url(url), expected, url)
+
+    def test_distinct(self):
+        self.assertEqual(
+            canonical_cache_url("http://project.dev"), "https://project.dev/"
+        )
+        self.assertEqual(
+            canonical_cache_url("https://project.dev/page?id=1&utm_source=x"),
+            "https://project.dev/page?id=1",
+        )
+        self.assertNotEqual(
+            canonical_cache_url("https://docs.project.dev/"),
+            canonical_cache_url("https://project.dev/"),
+        )
+
+
+class TestCanonicalKeysSession(CacheSessionTestCase):
+    def setUp(self):
+        super(TestCanonicalKeysSession, self).setUp()
+        self.redirect = None
+
+    def _send(self, adapter, request):
+        headers = {"Content-Type": "text/html"}
+        status = 200
+        if self.redirect and request.url != self.redirect:
+            headers["Location"] = self.redirect
+            status = 301
+        return self._response(adapter, request, b"<html></html>", headers, status)
+
+    def test_one_fetch(self):
+        session = get_file_cache_session("web", backend="sqlite")
+        with self._patch_send():
+            session.get("https://www.project.dev/page/").content
+            session.get("https://project.dev/page?utm_source=pypi").content
+        self.assertEqual(self.requests, ["https://www.project.dev/page/"])
+
+    def test_variant_redirect(self):
+        self.redirect = "https://project.dev/page"
+        session = get_file_cache_session("web", backend="sqlite")
+        with self._patch_send():
+            r = session.get("https://www.project.dev/page")
+            self.assertEqual(r.url, "https://project.dev/page")
+            # The redirect was not cached; the target is used for both
+            r = session.get("https://www.project.dev/page")
+            self.assertEqual(r.status_code, 200)
+            self.assertTrue(r.from_cache)
+        self.assertEqual(
+            self.requests,
+            ["https://www.project.dev/page", "https://project.dev/page"],
+        )
+
+    def test_json_not_canonical(self):
+        session = get_file_cache_session("json", backend="sqlite")
+        controller = session.get_adapter("https://pypi.org/").controller
+        self.assertEqual(
+            controller.cache_url("https://pypi.org/pypi/foo/json/"),
+            "https://pypi.org/pypi/foo/json/",
+        )
@@ -0,0 +1,80 @@
+import json
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from pypidb._cache import (
+    DEFAULT_TTL,
+    CachePolicy,
+    IgnoreVaryExpiresAfter,
+    cache_policies,
+    get_cache_policy,
+    get_file_cache_session,
+    load_cache_policies,
+    set_cache_policy,
+)
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+
+class TestCachePolicy(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.patchers = [
+            mock.patch(
+                "pypidb._cache.cache_subdir",
+                lambda name: os.path.join(self.tempdir, name),
+            ),
+            mock.patch.dict(cache_policies),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        shutil.rmtree(self.tempdir)
+
+    def test_defaults(self):
+        policy = get_cache_policy("gh")
+        self.assertEqual(policy.ttl, DEFAULT_TTL)
+        self.assertIn(404, policy.status_codes)
+        self.assertIsNone(policy.max_stale)
+        self.assertTrue(get_cache_policy("json").max_stale)
+        self.assertEqual(get_cache_policy("unknown").ttl, DEFAULT_TTL)
+
+    def test_session(self):
+        set_cache_policy("gh", ttl=30 * 24 * 60 * 60, status_codes=[200])
+        adapter = get_file_cache_session("gh").get_adapter("https://api.github.com/")
+        self.assertEqual(adapter.controller.cacheable_status_codes, (200,))
+        self.assertIsInstance(adapter.heuristic, IgnoreVaryExpiresAfter)
+        self.assertEqual(adapter.heuristic.delta.days, 30)
+        self.assertIsNone(adapter.controller.max_stale)
+
+        adapter = get_file_cache_session("json").get_adapter("https://pypi.org/")
+        self.assertIn(404, adapter.controller.cacheable_status_codes)
+        self.assertTrue(adapter.controller.max_stale)
+
+    def test_explicit_policy(self):
+        policy = CachePolicy(ttl=60, max_stale=30)
+        session = get_file_cache_session("web", policy=policy)
+        adapter = session.get_adapter("https://example.com/")
+        self.assertEqual(adapter.heuristic.delta.seconds, 60)
+        self.assertEqual(adapter.controller.max_stale, 30)
+
+    def test_load(self):
+        filename = os.path.join(self.tempdir, "policy.json")
+        with open(filename, "w") as f:
+            json.dump({"rtd": {"ttl": 60, "max_size": "1M"}}, f)
+        load_cache_policies(filename)
+        self.assertEqual(get_cache_policy("rtd").ttl, 60)
+        self.assertEqual(get_cache_policy("rtd").max_size, 1024 * 1024)
+
+        with open(filename, "w") as f:
+            json.dump({"rtd": {"ttl_days": 1}}, f)
+        with self.assertRaises(ValueError):
+            load_cache_policies(filename)
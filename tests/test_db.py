@@ -1,6 +1,12 @@
 import unittest
 
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
 from pypidb._db import Database, reverse_mappings
+from pypidb._exceptions import InvalidPackage
 
 
 class TestDB(unittest.TestCase):
@@ -10,6 +16,34 @@ class TestDB(unittest.TestCase):
         self.assertEqual(url, "https://github.com/pypa/setuptools_scm")
 
 
+class TestFindMany(unittest.TestCase):
+    def test_find_many(self):
+        def get_vcs(converter, name):
+            if name == "does-not-exist":
+                raise InvalidPackage(name)
+            return "https://github.com/example/" + name
+
+        db = Database()
+        with mock.patch("pypidb._pypi.Converter.get_vcs", get_vcs):
+            with mock.patch("pypidb._pypi.Converter.close") as close:
+                results = dict(
+                    db.find_many(["Foo_Bar", "baz", "does-not-exist"], workers=2)
+                )
+        self.assertTrue(close.called)
+
+        self.assertEqual(sorted(results), ["Foo_Bar", "baz", "does-not-exist"])
+        self.assertEqual(results["Foo_Bar"], "https://github.com/example/foo-bar")
+        self.assertEqual(results["baz"], "https://github.com/example/baz")
+        self.assertIsInstance(results["does-not-exist"], InvalidPackage)
+        self.assertEqual(
+            db.projects,
+            {
+                "foo-bar": "https://github.com/example/foo-bar",
+                "baz": "https://github.com/example/baz",
+            },
+        )
+
+
 class TestData(unittest.TestCase):
     def test_reverse_mapping_urls(self):
         for key in reverse_mappings:
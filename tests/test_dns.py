@@ -0,0 +1,147 @@
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from dns.exception import Timeout
+
+from pypidb._cache import _check_url_domain, prefetch_url_domains
+from pypidb import _dns
+from pypidb._db import Database
+from pypidb._dns import (
+    ExpiringDiskCache,
+    get_hostname,
+    install_dns_cache,
+    prefetch_hostnames,
+    resolve_hostname,
+)
+from pypidb._url_extract import _url_extractor_base
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+
+class _Answer(object):
+    def __init__(self, expiration=0):
+        self.expiration = expiration
+
+
+class TestPrefetch(unittest.TestCase):
+    def setUp(self):
+        self.lookups = []
+        self.lock = threading.Lock()
+        patchers = [
+            mock.patch.dict("pypidb._dns._results", clear=True),
+            mock.patch("socket.gethostbyname", self._gethostbyname),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _gethostbyname(self, hostname):
+        with self.lock:
+            self.lookups.append(hostname)
+        time.sleep(0.1)
+        if hostname.startswith("dead."):
+            raise socket.gaierror(-2, "Name or service not known")
+        return "192.0.2.1"
+
+    def test_concurrent(self):
+        hostnames = ["host{}.dev".format(i) for i in range(20)] + ["dead.invalid"]
+        start = time.time()
+        prefetch_hostnames(hostnames + [None])
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(sorted(self.lookups), sorted(hostnames))
+
+        self.assertTrue(resolve_hostname("host1.dev"))
+        self.assertFalse(resolve_hostname("dead.invalid"))
+        prefetch_hostnames(hostnames)
+        self.assertEqual(len(self.lookups), len(hostnames))
+
+    def test_check_url_domain(self):
+        prefetch_url_domains(
+            ["https://project.dev/a", "https://project.dev/b", "http://dead.invalid/"]
+        )
+        self.assertEqual(sorted(self.lookups), ["dead.invalid", "project.dev"])
+        self.assertTrue(_check_url_domain("https://project.dev/c"))
+        self.assertFalse(_check_url_domain("http://dead.invalid/"))
+        self.assertEqual(len(self.lookups), 2)
+
+    def test_url_extraction(self):
+        content = "See https://project.dev/docs or dead.dev/x and code.dev ."
+        urls = list(_url_extractor_base(content))
+        self.assertEqual(urls, ["https://project.dev/docs", "code.dev"])
+        self.assertIn("dead.dev", self.lookups)
+
+    def test_get_hostname(self):
+        self.assertEqual(get_hostname("https://User@Project.dev:80/a"), "project.dev")
+        self.assertEqual(get_hostname("project.dev/a"), "project.dev")
+
+
+class TestExpiringDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.cache = ExpiringDiskCache(self.tempdir, ttl=100, negative_ttl=10)
+
+    def tearDown(self):
+        self.cache.data.close()
+        shutil.rmtree(self.tempdir)
+
+    def _get(self, key, seconds):
+        with mock.patch("time.time", return_value=time.time() + seconds):
+            return self.cache.get(key)
+
+    def test_ttls(self):
+        self.cache.put("a", _Answer())
+        self.cache.put("nx", Timeout())
+        self.assertIsNotNone(self._get("a", 50))
+        self.assertIsNotNone(self._get("nx", 5))
+        self.assertIsNone(self._get("nx", 50))
+        self.assertIsNone(self._get("a", 150))
+
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 2))
+
+    def test_persistent_entries(self):
+        self.cache.data.set("old", _Answer(time.time() - 1))
+        self.assertIsNone(self.cache.get("old"))
+        self.assertNotIn("old", self.cache.data)
+
+    def test_flush(self):
+        self.cache.put("a", _Answer())
+        self.cache.put("b", _Answer())
+        self.cache.flush("a")
+        self.assertEqual(self.cache.stats()["entries"], 1)
+        self.cache.flush()
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+
+class TestInstall(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        patchers = [
+            mock.patch("pypidb._dns._installed", None),
+            mock.patch("pypidb._dns.override_system_resolver"),
+            mock.patch("pypidb._cache.cache_subdir", lambda name: self.tempdir),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def test_install(self):
+        cache = install_dns_cache("expiring")
+        self.assertIsInstance(cache, ExpiringDiskCache)
+        self.assertIs(install_dns_cache("expiring"), cache)
+        with self.assertRaises(ValueError):
+            install_dns_cache("forever")
+
+    def test_database(self):
+        Database()
+        self.assertIsNone(_dns._installed)
+        Database(dns_cache="expiring")
+        self.assertIsNotNone(_dns._installed)
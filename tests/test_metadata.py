@@ -0,0 +1,109 @@
+import json
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from pypidb._db import mappings
+from pypidb._exceptions import (
+    InvalidPackage,
+    PackageNotInLocalMetadata,
+    PackageWithoutUrls,
+)
+from pypidb._metadata import JsonLinesMetadataSource, MirrorMetadataSource
+from pypidb._pypi import Converter
+from pypidb._rules import DefaultRule
+from pypidb._store import ResolutionStore
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+
+def _package(name):
+    return {
+        "info": {"name": name, "home_page": "https://github.com/example/" + name},
+        "last_serial": 1,
+        "releases": {"1.0": []},
+        "urls": [],
+    }
+
+
+class _MetadataTestBase(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+
+class TestMirrorMetadataSource(_MetadataTestBase):
+    def test_get(self):
+        os.mkdir(os.path.join(self.tempdir, "foo-bar"))
+        with open(os.path.join(self.tempdir, "foo-bar", "json"), "w") as f:
+            json.dump(_package("Foo_Bar"), f)
+
+        source = MirrorMetadataSource(self.tempdir)
+        self.assertEqual(source.get_package_json("Foo_Bar"), _package("Foo_Bar"))
+        self.assertIsNone(source.get_package_json("baz"))
+
+
+class TestJsonLinesMetadataSource(_MetadataTestBase):
+    def test_get(self):
+        filename = os.path.join(self.tempdir, "dump.jsonl")
+        with open(filename, "w") as f:
+            for name in ["Foo_Bar", "baz", "qux"]:
+                f.write(json.dumps(_package(name)) + "\n")
+
+        source = JsonLinesMetadataSource(filename)
+        self.assertEqual(source.get_package_json("foo.bar"), _package("Foo_Bar"))
+        self.assertEqual(source.get_package_json("qux"), _package("qux"))
+        self.assertIsNone(source.get_package_json("missing"))
+        source.close()
+        self.assertTrue(os.path.exists(filename + ".idx"))
+
+        source = JsonLinesMetadataSource(filename)
+        self.assertEqual(source.get_package_json("baz"), _package("baz"))
+        source.close()
+
+
+class TestConverterMetadataSource(_MetadataTestBase):
+    def test_offline(self):
+        os.mkdir(os.path.join(self.tempdir, "foo"))
+        with open(os.path.join(self.tempdir, "foo", "json"), "w") as f:
+            json.dump(_package("foo"), f)
+
+        converter = Converter(
+            session=object(),  # any network use would fail
+            metadata_source=MirrorMetadataSource(self.tempdir),
+            offline_metadata=True,
+        )
+        self.assertEqual(converter._get_package_json("foo"), _package("foo"))
+        with self.assertRaises(InvalidPackage):
+            converter._get_package_json("missing")
+
+    def test_offline_miss_not_stored(self):
+        store = ResolutionStore(os.path.join(self.tempdir, "store.sqlite"))
+        self.addCleanup(store.close)
+        self.addCleanup(mappings.pop, "pypidb-offline-test", None)
+        converter = Converter(
+            session=object(),
+            metadata_source=MirrorMetadataSource(self.tempdir),
+            offline_metadata=True,
+            store=store,
+        )
+        with self.assertRaises(PackageNotInLocalMetadata):
+            converter.get_vcs("pypidb-offline-test")
+        self.assertNotIn("pypidb-offline-test", mappings)
+        fingerprint = DefaultRule("pypidb-offline-test").fingerprint()
+        self.assertIsNone(store.get_failure("pypidb-offline-test", fingerprint))
+
+        # the next online lookup uses PyPI
+        converter = Converter(store=store)
+        with mock.patch.object(
+            converter, "_get_package_json", side_effect=PackageWithoutUrls("online")
+        ):
+            with self.assertRaises(PackageWithoutUrls):
+                converter.get_vcs("pypidb-offline-test")
@@ -0,0 +1,77 @@
+import threading
+import time
+import unittest
+
+import requests
+
+from pypidb._pypi import Converter
+from pypidb._rules import Rule
+from pypidb._types import UrlSet
+from pypidb._url_extract import _url_extractor_wrapper_no_dns
+
+_pages = {
+    "http://foo-one.example.com/": "Nothing here",
+    "http://foo-two.example.com/": "Nor here",
+    "http://foo-three.example.com/": "Source at https://github.com/example/foo",
+    "http://foo-four.example.com/": "Never needed",
+    "http://foo-five.example.com/": "Never needed",
+}
+
+
+class FakeSession(object):
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.fetched = []
+
+    def get(self, url, headers=None, timeout=None):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.fetched.append(url)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+
+        r = requests.Response()
+        r.status_code = 200
+        r.url = url
+        r.encoding = "utf-8"
+        r.headers["content-type"] = "text/html"
+        r._content = _pages[url].encode("utf-8")
+        return r
+
+
+class TestParallelFetches(unittest.TestCase):
+    def _resolve(self, parallel_fetches):
+        session = FakeSession()
+        converter = Converter(
+            web_session=session, parallel_fetches=parallel_fetches
+        )
+        rule = Rule("foo", link_extract=_url_extractor_wrapper_no_dns)
+        inputs = [UrlSet(set(_pages))]
+        url = converter._get_vcs_links(rule, "foo", {}, inputs)
+        self.converter = converter
+        return url, session
+
+    def test_serial(self):
+        url, session = self._resolve(None)
+        self.assertEqual(url, "https://github.com/example/foo")
+        self.assertEqual(session.peak, 1)
+
+    def test_parallel(self):
+        url, session = self._resolve(3)
+        self.assertEqual(url, "https://github.com/example/foo")
+        self.assertEqual(session.peak, 3)
+        self.assertLessEqual(len(session.fetched), len(_pages))
+
+    def test_close(self):
+        self._resolve(3)
+        executor = self.converter._executor
+        self.converter.close()
+        self.assertIsNone(self.converter._executor)
+        with self.assertRaises(RuntimeError):
+            executor.submit(time.sleep, 0)
+        self.converter.close()
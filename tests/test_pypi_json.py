@@ -0,0 +1,161 @@
+import gzip
+import json
+import time
+import unittest
+
+from pypidb._cache import (
+    CachePolicy,
+    _TrimmedResponse,
+    get_cache_policy,
+    get_file_cache_session,
+)
+from pypidb._pypi import Converter
+from pypidb._pypi_json import (
+    parse_package_json,
+    trim_package_json,
+    trim_package_json_body,
+)
+from tests.cache_utils import CacheSessionTestCase
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+URL = "https://pypi.org/pypi/foo/json"
+
+_FILE = {
+    "filename": "foo-1.0.tar.gz",
+    "url": "https://files.pythonhosted.org/foo-1.0.tar.gz",
+    "digests": {"sha256": "0" * 64},
+    "size": 1000,
+}
+_PACKAGE = {
+    "info": {
+        "name": "foo",
+        "version": "1.0",
+        "summary": "Foo",
+        "description": "Foo " * 100,
+        "license": "MIT",
+        "author_email": "foo@project.dev",
+        "home_page": "https://project.dev/",
+        "bugtrack_url": None,
+        "project_urls": {"Source": "https://github.com/foo/foo"},
+        "classifiers": ["License :: OSI Approved :: MIT License"] * 10,
+        "requires_dist": ["bar"],
+    },
+    "last_serial": 1234,
+    "releases": {"0.9": [], "1.0": [_FILE, _FILE]},
+    "urls": [_FILE],
+}
+
+
+class TestTrimPackageJson(unittest.TestCase):
+    def test_trim(self):
+        trimmed = trim_package_json(_PACKAGE)
+        self.assertEqual(
+            sorted(trimmed["info"]),
+            [
+                "author_email",
+                "bugtrack_url",
+                "description",
+                "home_page",
+                "license",
+                "name",
+                "project_urls",
+                "summary",
+                "version",
+            ],
+        )
+        self.assertEqual(trimmed["releases"], {"0.9": 0, "1.0": 2})
+        self.assertEqual(trimmed["urls"], [{"url": _FILE["url"]}])
+        self.assertEqual(trimmed["last_serial"], 1234)
+        self.assertEqual(trim_package_json(trimmed), trimmed)
+
+    def test_body(self):
+        body = json.dumps(_PACKAGE).encode("utf-8")
+        trimmed = trim_package_json_body(body)
+        self.assertLess(len(trimmed), len(body))
+        self.assertEqual(trim_package_json_body(gzip.compress(body), "gzip"), trimmed)
+        self.assertIsNone(trim_package_json_body(b"not json"))
+        self.assertIsNone(trim_package_json_body(b"[]"))
+        self.assertIsNone(trim_package_json_body(body, "compress"))
+
+
+class TestParsePackageJson(unittest.TestCase):
+    def test_parse(self):
+        data = dict(_PACKAGE)
+        data["info"] = dict(data["info"], description='"[{a}]\\" }')
+        expected = trim_package_json(data)
+        for content in (json.dumps(data), json.dumps(data, indent=2)):
+            self.assertEqual(parse_package_json(content.encode("utf-8")), expected)
+
+    def test_trimmed(self):
+        trimmed = trim_package_json(_PACKAGE)
+        content = json.dumps(trimmed).encode("utf-8")
+        self.assertEqual(parse_package_json(content), trimmed)
+
+    def test_invalid(self):
+        self.assertEqual(parse_package_json(b" {} "), {})
+        for content in (b"[]", b'{"info": ', b'{"info" {}}', b'{"info": {}'):
+            with self.assertRaises(ValueError):
+                parse_package_json(content)
+
+    def test_truncated(self):
+        content = json.dumps(_PACKAGE).encode("utf-8")
+        content = content[: content.index(b'"size": ') + 8] + b"1" * 10000
+        start = time.time()
+        with self.assertRaises(ValueError):
+            parse_package_json(content)
+        self.assertLess(time.time() - start, 1)
+
+    def test_converter(self):
+        response = mock.Mock(status_code=200)
+        response.content = json.dumps(_PACKAGE).encode("utf-8")
+        converter = Converter()
+        with mock.patch.object(converter, "_get", return_value=response):
+            data = converter._get_package_json("foo")
+        self.assertEqual(data, trim_package_json(_PACKAGE))
+
+
+class TestTrimmedStorage(CacheSessionTestCase):
+    def _send(self, adapter, request):
+        return self._response(
+            adapter,
+            request,
+            gzip.compress(json.dumps(_PACKAGE).encode("utf-8")),
+            {"Content-Type": "application/json", "Content-Encoding": "gzip"},
+        )
+
+    def test_session(self):
+        policy = get_cache_policy("json").replace(storage="trimmed", memory_size=None)
+        session = get_file_cache_session("json", backend="sqlite", policy=policy)
+        with self._patch_send():
+            self.assertEqual(session.get(URL).json(), _PACKAGE)
+            response = session.get(URL)
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(response.json(), trim_package_json(_PACKAGE))
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_trimmed_response(self):
+        # the attributes read by Serializer.dumps of CacheControl 0.12 to 0.14
+        response = mock.Mock(
+            spec=["headers", "status", "version", "reason", "decode_content"],
+            headers={"Content-Encoding": "gzip", "ETag": "1"},
+            status=200,
+            version=11,
+            reason="OK",
+            decode_content=True,
+        )
+        trimmed = _TrimmedResponse(response, b"{}")
+        self.assertEqual(trimmed.headers, {"ETag": "1", "Content-Length": "2"})
+        self.assertEqual(trimmed.strict, 0)
+        for name in ("status", "version", "reason", "decode_content"):
+            self.assertEqual(getattr(trimmed, name), getattr(response, name))
+
+        response.strict = 1
+        self.assertEqual(_TrimmedResponse(response, b"{}").strict, 1)
+
+    def test_unknown_storage(self):
+        with self.assertRaises(ValueError):
+            CachePolicy(storage="partial")
@@ -0,0 +1,230 @@
+import shutil
+import tempfile
+import time
+import unittest
+
+import requests
+
+from pypidb import _cache
+from pypidb._cache import LookupFailure, cached_lookup
+from pypidb._lp import _launchpad
+from pypidb._pypi import Converter
+from pypidb._rtd import ReadtheDocs
+from pypidb._rules import DefaultRule
+from pypidb._scm_url_cleaner import (
+    FixerIndex,
+    SCMURLCleaner,
+    _follow_rtd_get_repo,
+    _get_redirect_location,
+    _match_hostname,
+    _reject,
+)
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+
+def _linear_fixer(url):
+    for condition, func in SCMURLCleaner.fixers.items():
+        if _match_hostname(url, condition, require_path=False):
+            return func
+
+
+def _get_urls():
+    urls = set()
+    for condition in SCMURLCleaner.fixers:
+        condition = condition.replace("http://", "")
+        for prefix in ("www.", "foo.", "", "a.b."):
+            host = condition.replace("*.", prefix)
+            for scheme in ("https://", "http://", "git://", "ftp://", "https:///"):
+                for suffix in ("", "foo/bar", "/foo/bar/", "x/y", ".git"):
+                    urls.add(scheme + host + suffix)
+    return sorted(urls)
+
+
+class TestFixerIndex(unittest.TestCase):
+    def test_same_as_linear_search(self):
+        index = FixerIndex(SCMURLCleaner.fixers)
+        for url in _get_urls():
+            self.assertIs(index.get(url), _linear_fixer(url), url)
+
+    def test_first_match(self):
+        first = object()
+        second = object()
+        index = FixerIndex(
+            {"*.project.dev": first, "docs.project.dev/": second, "a.dev": None}
+        )
+        self.assertIs(index.get("https://docs.project.dev/a"), first)
+        self.assertIs(index.get("https://www.project.dev/a"), None)
+        self.assertIs(index.get("mailto:docs.project.dev"), None)
+
+
+class _OtherCleaner(SCMURLCleaner):
+    fixers = {"github.com": _reject}
+
+
+class TestSCMURLCleaner(unittest.TestCase):
+    def test_fixers_tables(self):
+        url = "https://github.com/foo/bar/issues"
+        for i in range(2):
+            root = SCMURLCleaner().get_root(url)
+            self.assertEqual(root, "https://github.com/foo/bar")
+            self.assertIs(_OtherCleaner().get_root(url), False)
+        self.assertIsNot(
+            SCMURLCleaner()._get_fixer_index(), _OtherCleaner()._get_fixer_index()
+        )
+
+    def test_clean_many(self):
+        cleaner = SCMURLCleaner(cache_size=10)
+        urls = [
+            "https://travis-ci.org/foo/bar",
+            "https://github.com/foo/bar/issues",
+            "https://travis-ci.org/foo/bar",
+        ]
+        self.assertEqual(
+            cleaner.clean_many(urls),
+            {
+                "https://travis-ci.org/foo/bar": "https://github.com/foo/bar",
+                "https://github.com/foo/bar/issues": "https://github.com/foo/bar",
+            },
+        )
+        self.assertEqual(len(cleaner._root_cache), 2)
+        self.assertEqual(len(SCMURLCleaner(cache_size=0)._root_cache), 0)
+
+
+class TestCachedLookup(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.calls = []
+        patchers = [
+            mock.patch("pypidb._cache.cache_subdir", lambda name: self.tempdir),
+            mock.patch("pypidb._cache._lookup_cache", None),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def _lookup(self, url, fail=False):
+        self.calls.append(url)
+        if fail:
+            raise RuntimeError(url)
+        if "dead" not in url:
+            return url + "/repo"
+
+    def _get(self, url, seconds=0, **kwargs):
+        with mock.patch("time.time", return_value=time.time() + seconds):
+            return cached_lookup(self._lookup)(url, **kwargs)
+
+    def test_ttls(self):
+        self.assertEqual(self._get("https://project.dev"), "https://project.dev/repo")
+        self.assertIsNone(self._get("https://dead.dev"))
+        # a new process reads the same directory
+        _cache._lookup_cache = None
+        self.assertEqual(
+            self._get("https://project.dev", 2 * _cache.DAY), "https://project.dev/repo"
+        )
+        self.assertIsNone(self._get("https://dead.dev", _cache.DAY / 2))
+        self.assertEqual(len(self.calls), 2)
+
+        self.assertIsNone(self._get("https://dead.dev", 2 * _cache.DAY))
+        self._get("https://project.dev", 31 * _cache.DAY)
+        self.assertEqual(len(self.calls), 4)
+
+    def test_exception(self):
+        for i in range(2):
+            with self.assertRaises(RuntimeError):
+                self._get("https://project.dev", fail=True)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_version(self):
+        self._get("https://project.dev")
+        with mock.patch("pypidb._cache.__version__", "0.0.0"):
+            self._get("https://project.dev")
+        self.assertEqual(len(self.calls), 2)
+
+    def test_disabled(self):
+        with mock.patch("pypidb._cache.LOOKUP_TTL", 0):
+            self._get("https://project.dev")
+            self._get("https://project.dev")
+        self.assertEqual(len(self.calls), 2)
+
+    def test_redirect_location(self):
+        session = mock.Mock()
+        session.get.return_value.headers = {"location": "https://opendev.org/foo/"}
+        with mock.patch(
+            "pypidb._scm_url_cleaner.get_file_cache", return_value=session
+        ):
+            for i in range(2):
+                self.assertEqual(
+                    _get_redirect_location("https://git.openstack.org/foo"),
+                    "https://opendev.org/foo",
+                )
+        self.assertEqual(session.get.call_count, 1)
+
+    def test_launchpad_network_error(self):
+        client = mock.Mock()
+        client.get_project.side_effect = requests.ConnectionError
+        with mock.patch("pypidb._lp._get_lp", return_value=client):
+            for i in range(2):
+                with self.assertRaises(LookupFailure):
+                    _launchpad("https://launchpad.net/foo")
+            client.get_project.side_effect = None
+            client.get_project.return_value.status_code = 503
+            client.get_project.return_value.raise_for_status.side_effect = (
+                requests.HTTPError
+            )
+            with self.assertRaises(LookupFailure):
+                _launchpad("https://launchpad.net/foo")
+        self.assertEqual(client.get_project.call_count, 3)
+
+    def test_nested_failure(self):
+        @cached_lookup
+        def inner(url):
+            self.calls.append(url)
+            raise requests.ConnectionError(url)
+
+        @cached_lookup
+        def outer(url):
+            try:
+                return inner(url)
+            except LookupFailure:
+                return url
+
+        for i in range(2):
+            self.assertEqual(outer("https://project.dev"), "https://project.dev")
+        self.assertEqual(len(self.calls), 2)
+
+    def test_converter_survives_failure(self):
+        client = mock.Mock()
+        client.get_project.side_effect = requests.Timeout
+        url = "https://launchpad.net/foo"
+        converter = Converter()
+        with mock.patch("pypidb._lp._get_lp", return_value=client):
+            self.assertIsNone(converter._accept_url(DefaultRule("foo"), "foo", url))
+            self.assertEqual(converter._cleaner.clean_many([url]), {url: None})
+        self.assertEqual(client.get_project.call_count, 2)
+
+    def test_rtd_redirect_error(self):
+        session = mock.Mock()
+        url = "https://foo.readthedocs-hosted.com/"
+        with mock.patch(
+            "pypidb._scm_url_cleaner.get_file_cache", return_value=session
+        ), mock.patch(
+            "pypidb._scm_url_cleaner._rtd_get_repo", return_value="https://a/b"
+        ) as get_repo:
+            for error in (requests.Timeout, requests.HTTPError):
+                session.get.side_effect = error
+                self.assertEqual(_follow_rtd_get_repo(url), "https://a/b")
+                get_repo.assert_called_with(url)
+        # the timeout is not cached
+        self.assertEqual(session.get.call_count, 2)
+
+    def test_rtd_invalid_json(self):
+        session = mock.Mock()
+        session.get.return_value.json.side_effect = ValueError
+        with mock.patch("pypidb._rtd.session", session):
+            with self.assertRaises(ValueError):
+                ReadtheDocs().get_project("pypidb-invalid-json")
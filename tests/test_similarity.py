@@ -0,0 +1,67 @@
+import unittest
+
+from pypidb._similarity import (
+    NumpyBackend,
+    PairwiseBackend,
+    SimilarityScorer,
+    _compute_similarity,
+    _similarity_func,
+    get_backend,
+    numpy,
+)
+
+NAMES = ["requests", "django-rest-framework-jwt", "python_yara", "backports.lzma"]
+URLS = [
+    "https://github.com/psf/requests",
+    "https://github.com/psf/requests/",
+    "https://github.com/GetBlimp/django-rest-framework-jwt",
+    "https://github.com/Styria-Digital/drf-jwt.git",
+    "https://github.com/VirusTotal/yara-python",
+    "https://github.com/r3m0t/backports.lzma",
+    "https://gitlab.com/group/sub/python-sdk",
+    "https://sourceforge.net/p/foo/?p=bar",
+    "https://project.dev/",
+    "https://project.dev/" + "a" * 250,
+]
+
+
+def _textdistance(a, b):
+    return _similarity_func(a, b)
+
+
+class TestSimilarityScorer(unittest.TestCase):
+    def _check_backend(self, backend):
+        for name in NAMES:
+            expected = SimilarityScorer(
+                name, backend=PairwiseBackend(_textdistance)
+            ).score_many(URLS)
+            scores = SimilarityScorer(name, backend=backend).score_many(URLS)
+            self.assertEqual(scores, expected)
+            for url in URLS:
+                self.assertIs(type(scores[url]), type(expected[url]))
+
+    def test_python(self):
+        self._check_backend(PairwiseBackend())
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_numpy(self):
+        backend = NumpyBackend()
+        backend.max_cells = 1000
+        self._check_backend(backend)
+
+    def test_pairs(self):
+        pairs = [("abcab", "bcabca"), ("aaa", "aaa"), ("", "a"), ("ab", "ba")]
+        self.assertEqual(
+            PairwiseBackend()(pairs), [_similarity_func(a, b) for a, b in pairs]
+        )
+
+    def test_compute_similarity(self):
+        self.assertEqual(_compute_similarity("requests", URLS[0]), 0)
+        self.assertEqual(
+            _compute_similarity("requests", URLS[2], comp_op=max),
+            max(SimilarityScorer("requests", comp_op=list).score(URLS[2])),
+        )
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_backend("cuda")
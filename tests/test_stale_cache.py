@@ -0,0 +1,61 @@
+import time
+
+from pypidb._cache import get_file_cache_session
+from tests.cache_utils import CacheSessionTestCase
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+DAY = 24 * 60 * 60
+URL = "https://pypi.org/pypi/foo/json"
+
+
+class TestStaleWhileRevalidate(CacheSessionTestCase):
+    def setUp(self):
+        super(TestStaleWhileRevalidate, self).setUp()
+        self.body = b"1"
+
+    def _send(self, adapter, request):
+        return self._response(
+            adapter, request, self.body, {"Content-Type": "application/json"}
+        )
+
+    def _get(self, session, now=None):
+        if now is None:
+            return session.get(URL).content
+        with mock.patch("time.time", return_value=now):
+            return session.get(URL).content
+
+    def _wait(self, session):
+        adapter = session.get_adapter(URL)
+        for thread in list(adapter._revalidations.values()):
+            thread.join()
+
+    def test_stale_while_revalidate(self):
+        session = get_file_cache_session("json", backend="sqlite", max_stale=2 * DAY)
+        with self._patch_send():
+            self.assertEqual(self._get(session), b"1")
+            self.assertEqual(self._get(session), b"1")
+            self.assertEqual(len(self.requests), 1)
+
+            # Stale for a day: the cached body is returned and refreshed
+            self.body = b"2"
+            self.assertEqual(self._get(session, time.time() + 6 * DAY), b"1")
+            self._wait(session)
+            self.assertEqual(len(self.requests), 2)
+            self.assertEqual(self._get(session), b"2")
+
+            # Stale for longer than max_stale: fetched before returning
+            self.body = b"3"
+            self.assertEqual(self._get(session, time.time() + 8 * DAY), b"3")
+            self.assertEqual(len(self.requests), 3)
+
+    def test_disabled(self):
+        session = get_file_cache_session("json", backend="sqlite", max_stale=0)
+        with self._patch_send():
+            self._get(session)
+            self.body = b"2"
+            self.assertEqual(self._get(session, time.time() + 6 * DAY), b"2")
+            self.assertEqual(len(self.requests), 2)
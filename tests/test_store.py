@@ -0,0 +1,190 @@
+import os.path
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+from pypidb._db import mappings
+from pypidb._exceptions import InvalidPackage, PackageWithoutUrls
+from pypidb._pypi import Converter
+from pypidb._rules import DefaultRule, Rule
+from pypidb._store import ResolutionStore
+
+
+class TestResolutionStore(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.store = ResolutionStore(os.path.join(self.tempdir, "store.sqlite"))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tempdir)
+
+    def test_fresh(self):
+        self.store.add("foo", "Foo", "https://github.com/a/foo", "rule1", 10)
+        self.assertEqual(
+            self.store.get("foo", "rule1"), ("Foo", "https://github.com/a/foo")
+        )
+        self.assertIsNone(self.store.get("foo", "rule2"))
+        self.assertIsNone(self.store.get("bar", "rule1"))
+
+    def test_expired(self):
+        self.store.ttl = -1
+        self.store.add("foo", "Foo", "https://github.com/a/foo", "rule1", 10)
+        self.assertIsNone(self.store.get("foo", "rule1"))
+        self.assertIsNone(self.store.get("foo", "rule1", 11))
+
+        self.store.ttl = 60
+        self.assertEqual(
+            self.store.get("foo", "rule1", 10), ("Foo", "https://github.com/a/foo")
+        )
+        # renewed
+        self.assertEqual(
+            self.store.get("foo", "rule1"), ("Foo", "https://github.com/a/foo")
+        )
+
+    def test_persistent(self):
+        self.store.add("foo", "Foo", "https://github.com/a/foo", "rule1", 10)
+        other = ResolutionStore(self.store.path)
+        try:
+            self.assertEqual(
+                other.get("foo", "rule1"), ("Foo", "https://github.com/a/foo")
+            )
+        finally:
+            other.close()
+
+
+class TestRuleFingerprint(unittest.TestCase):
+    def test_fingerprint(self):
+        self.assertEqual(
+            DefaultRule("Foo_Bar").fingerprint(), DefaultRule("foo-bar").fingerprint()
+        )
+        self.assertNotEqual(
+            Rule("foo-bar").fingerprint(),
+            Rule("foo-bar", ignore_urls=["example.com"]).fingerprint(),
+        )
+        self.assertNotEqual(
+            Rule("foo-bar").fingerprint(), Rule("foo-bar", ["baz"]).fingerprint()
+        )
+
+
+class TestConverterStore(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.store = ResolutionStore(os.path.join(self.tempdir, "store.sqlite"))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tempdir)
+        mappings.pop("pypidb-store-test", None)
+
+    def test_stored_result(self):
+        fingerprint = DefaultRule("pypidb-store-test").fingerprint()
+        self.store.add(
+            "pypidb-store-test",
+            "pypidb_store_test",
+            "https://github.com/example/pypidb-store-test",
+            fingerprint,
+            10,
+        )
+        converter = Converter(store=self.store)
+        with mock.patch.object(
+            converter, "_get_package_json", side_effect=AssertionError
+        ):
+            url = converter.get_vcs("pypidb_store_test")
+        self.assertEqual(url, "https://github.com/example/pypidb-store-test")
+        self.assertEqual(mappings["pypidb-store-test"], url)
+
+    def test_stored_result_same_serial(self):
+        fingerprint = DefaultRule("pypidb-store-test").fingerprint()
+        self.store.ttl = -1
+        self.store.add(
+            "pypidb-store-test",
+            "pypidb_store_test",
+            "https://github.com/example/pypidb-store-test",
+            fingerprint,
+            10,
+        )
+        converter = Converter(store=self.store)
+        data = {"info": {"name": "pypidb_store_test"}, "last_serial": 10}
+        with mock.patch.object(converter, "_get_package_json", return_value=data):
+            url = converter.get_vcs("pypidb_store_test")
+        self.assertEqual(url, "https://github.com/example/pypidb-store-test")
+
+
+class TestFailureStore(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.store = ResolutionStore(os.path.join(self.tempdir, "store.sqlite"))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tempdir)
+        mappings.pop("pypidb-store-test", None)
+
+    def test_failure(self):
+        err = PackageWithoutUrls("foo has no usable urls")
+        self.store.add_failure("foo", err, "rule1")
+        err = self.store.get_failure("foo", "rule1")
+        self.assertIsInstance(err, PackageWithoutUrls)
+        self.assertEqual(str(err), "foo has no usable urls")
+        self.assertIsNone(self.store.get_failure("bar", "rule1"))
+        self.assertIsNone(self.store.get_failure("foo", "rule2"))
+
+        self.store.failure_ttl = -1
+        self.store.add_failure("foo", err, "rule1")
+        self.assertIsNone(self.store.get_failure("foo", "rule1"))
+
+    def test_failure_without_fingerprint(self):
+        self.store.close()
+        conn = sqlite3.connect(self.store.path)
+        with conn:
+            conn.execute("DROP TABLE failures")
+            conn.execute(
+                "CREATE TABLE failures ("
+                "key TEXT PRIMARY KEY, error TEXT, message TEXT, expires REAL)"
+            )
+            conn.execute(
+                "INSERT INTO failures VALUES (?, ?, ?, ?)",
+                ("foo", "PackageWithoutUrls", "foo", time.time() + 60),
+            )
+        conn.close()
+        self.store = ResolutionStore(self.store.path)
+        self.assertIsNone(self.store.get_failure("foo", "rule1"))
+
+    def test_converter_failure(self):
+        converter = Converter(store=self.store)
+        with mock.patch.object(
+            converter,
+            "_get_package_json",
+            side_effect=InvalidPackage("Invalid package name pypidb-store-test"),
+        ):
+            with self.assertRaises(InvalidPackage):
+                converter.get_vcs("pypidb-store-test")
+
+        mappings.pop("pypidb-store-test")
+
+        converter = Converter(store=self.store)
+        with mock.patch.object(
+            converter, "_get_package_json", side_effect=AssertionError
+        ):
+            with self.assertRaises(InvalidPackage) as cm:
+                converter.get_vcs("pypidb-store-test")
+        self.assertEqual(str(cm.exception), "Invalid package name pypidb-store-test")
+
+        mappings.pop("pypidb-store-test")
+
+        # failures stored by another version are looked up again
+        converter = Converter(store=self.store)
+        with mock.patch("pypidb._rules.__version__", "0.0.0"):
+            with mock.patch.object(
+                converter, "_get_package_json", side_effect=PackageWithoutUrls("x")
+            ):
+                with self.assertRaises(PackageWithoutUrls):
+                    converter.get_vcs("pypidb-store-test")
@@ -0,0 +1,44 @@
+import unittest
+
+import requests
+
+from pypidb._html import get_html_hrefs
+from pypidb._types import Webpage
+
+try:
+    from unittest import mock
+except ImportError:  # pragma: no cover
+    import mock
+
+_PAGE = u'<html><body><a href="/repo">r\u00e9po</a></body></html>'
+
+
+class TestWebpage(unittest.TestCase):
+    def _get_response(self):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = _PAGE.encode("utf-8")
+        response.encoding = "utf-8"
+        return response
+
+    def test_decoded_once(self):
+        response = self._get_response()
+        page = Webpage(response, "https://project.dev/")
+        with mock.patch.object(
+            requests.Response, "text", new_callable=mock.PropertyMock
+        ) as text:
+            text.return_value = _PAGE
+            self.assertEqual(page.value, _PAGE)
+            self.assertEqual(page.value, _PAGE)
+            self.assertEqual(text.call_count, 1)
+
+    def test_content(self):
+        response = self._get_response()
+        page = Webpage(response, "https://project.dev/")
+        self.assertIs(page.content, response.content)
+
+    def test_hrefs_from_bytes(self):
+        url = "https://project.dev/docs/"
+        expected = ["https://project.dev/repo"]
+        self.assertEqual(get_html_hrefs(_PAGE, url), expected)
+        self.assertEqual(get_html_hrefs(_PAGE.encode("utf-8"), url), expected)
@@ -35,7 +35,7 @@ def normalise_list(in_list):
 
 
 _global_converter = _global_db = Database(
-    website_timeout=(15, 30), store_fetch_list=True
+    website_timeout=(15, 30), store_fetch_list=True, dns_cache="persistent"
 )
 
 